@@ -0,0 +1,173 @@
+import warnings
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+import sweep as s
+
+
+##------------------------Origins--------------------------##
+
+def make_origins(n, initial=730, horizon=30, step=7, window=None):
+    '''This function returns the forecast origins of a walk-forward backtest over n days as
+    (start, end) positions of each training span; the forecast covers end to end + horizon.
+    Training spans expand from the first day, or roll with a fixed length if window is given'''
+    ends = np.arange(initial, n - horizon + 1, step)
+    starts = np.zeros_like(ends) if window is None else np.maximum(ends - window, 0)
+    
+    return starts, ends
+
+def full_daily(daily, target_var='count_of_crime'):
+    '''This function returns the daily target as a gap-free array, with days missing from the
+    daily dataframe counted as zero, and its date index'''
+    y = daily[target_var].asfreq('D', fill_value=0)
+    
+    return y.to_numpy(dtype=float), y.index
+
+##------------------------Incremental Models--------------------------##
+
+def average_forecasts(csum, starts, ends, horizon, window=None):
+    '''This function returns the (origin x horizon) forecasts of the average over each training span,
+    or over its last window days, for every origin at once from the cumulative sum'''
+    first = starts if window is None else np.maximum(ends - window, starts)
+    levels = (csum[ends] - csum[first]) / (ends - first)
+    
+    return np.repeat(levels[:, None], horizon, axis=1)
+
+def holt_states(y, alpha, beta, phi, level, trend):
+    '''This function runs Holt's (optionally damped) linear trend recursion over y with fixed
+    smoothing parameters and returns the level and trend after each day'''
+    levels = np.empty(len(y))
+    trends = np.empty(len(y))
+    for t, value in enumerate(y):
+        previous = level
+        level = alpha * value + (1 - alpha) * (previous + phi * trend)
+        trend = beta * (level - previous) + (1 - beta) * phi * trend
+        levels[t], trends[t] = level, trend
+    
+    return levels, trends
+
+def fit_holt_params(y, damped_trend):
+    '''This function estimates Holt's smoothing parameters and initial state on y'''
+    from statsmodels.tsa.api import ExponentialSmoothing
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        params = ExponentialSmoothing(y, trend='add', damped_trend=damped_trend,
+                                      initialization_method='estimated').fit(optimized=True).params
+    phi = params['damping_trend'] if damped_trend else 1.0
+    
+    return params['smoothing_level'], params['smoothing_trend'], phi, params['initial_level'], params['initial_trend']
+
+def holt_forecasts(y, starts, ends, horizon, damped_trend=False, refit_every=None):
+    '''This function returns the (origin x horizon) Holt forecasts for every origin. Smoothing
+    parameters are estimated on the first origin's training span (and again every refit_every
+    origins); between refits the level and trend state is advanced day by day, not refit. With
+    rolling spans (starts that move) the state is restarted at each origin's own start from the
+    fitted initial level and trend, so only the window's days feed its forecast'''
+    forecasts = np.empty((len(ends), horizon))
+    refits = [0] if not refit_every else list(range(0, len(ends), refit_every))
+    for i, first in enumerate(refits):
+        last = refits[i + 1] if i + 1 < len(refits) else len(ends)
+        alpha, beta, phi, level, trend = fit_holt_params(y[starts[first]:ends[first]], damped_trend)
+        #Trend multiplier for each forecast step: phi + phi^2 + ... + phi^h
+        damping = np.cumsum(phi ** np.arange(1, horizon + 1))
+        if (starts[first:last] == starts[first]).all():
+            #Expanding spans share one run of the state from the start of the fitted span
+            offset = starts[first]
+            levels, trends = holt_states(y[offset:ends[last - 1]], alpha, beta, phi, level, trend)
+            state = ends[first:last] - offset - 1
+            forecasts[first:last] = levels[state, None] + damping[None, :] * trends[state, None]
+        else:
+            for j in range(first, last):
+                levels, trends = holt_states(y[starts[j]:ends[j]], alpha, beta, phi, level, trend)
+                forecasts[j] = levels[-1] + damping * trends[-1]
+    
+    return forecasts
+
+##------------------------Refit Models--------------------------##
+
+def refit_forecast(config, y, horizon):
+    '''This function refits one configuration on a training span and returns its forecast,
+    or NaNs if the fit fails'''
+    try:
+        return s.fit_forecast(config, y, horizon)[1]
+    except Exception:
+        return np.full(horizon, np.nan)
+
+def refit_forecasts(config, y, starts, ends, horizon, pool=None):
+    '''This function refits a configuration from scratch at every origin, spreading the origins
+    across the process pool if one is given'''
+    spans = [y[start:end] for start, end in zip(starts, ends)]
+    n = len(spans)
+    if pool is None:
+        rows = list(map(refit_forecast, [config] * n, spans, [horizon] * n))
+    else:
+        rows = list(pool.map(refit_forecast, [config] * n, spans, [horizon] * n, chunksize=max(1, n // 32)))
+    
+    return np.vstack(rows) if rows else np.empty((0, horizon))
+
+##------------------------Backtest--------------------------##
+
+#Models backtested by default
+BACKTEST_MODELS = [
+    {'model': 'simple_average'},
+    {'model': 'moving_average', 'window': 7},
+    {'model': 'moving_average', 'window': 30},
+    {'model': 'moving_average', 'window': 90},
+    {'model': 'holt', 'damped_trend': False},
+    {'model': 'holt', 'damped_trend': True},
+]
+
+def is_incremental(config):
+    '''This function checks whether a configuration can be advanced between origins without refitting'''
+    if config['model'] in ('simple_average', 'moving_average'):
+        return True
+    
+    return (config['model'] == 'holt') and not config.get('use_boxcox')
+
+def model_forecasts(config, y, csum, starts, ends, horizon, refit_every=None, pool=None):
+    '''This function returns the (origin x horizon) forecasts of one configuration, updating
+    averages and Holt incrementally and refitting anything else per origin'''
+    if config['model'] == 'simple_average':
+        return average_forecasts(csum, starts, ends, horizon)
+    if config['model'] == 'moving_average':
+        return average_forecasts(csum, starts, ends, horizon, config['window'])
+    if is_incremental(config):
+        return holt_forecasts(y, starts, ends, horizon, config.get('damped_trend', False), refit_every)
+    
+    return refit_forecasts(config, y, starts, ends, horizon, pool)
+
+def walk_forward(daily, models=None, initial=730, horizon=30, step=7, window=None, refit_every=None,
+                 target_var='count_of_crime', max_workers=None):
+    '''This function backtests each model configuration (sweep.model_grid style, BACKTEST_MODELS by
+    default) over rolling origins of the daily series: at every origin the model is trained on the
+    span before it and scored on the next horizon days. Returns one row per model and origin with
+    the RMSE and MAE of that forecast'''
+    models = BACKTEST_MODELS if models is None else models
+    y, dates = full_daily(daily, target_var)
+    csum = np.concatenate([[0.0], np.cumsum(y)])
+    starts, ends = make_origins(len(y), initial, horizon, step, window)
+    #Actual values for each origin's forecast days
+    actual = sliding_window_view(y, horizon)[ends]
+    needs_pool = not all(is_incremental(config) for config in models)
+    pool = ProcessPoolExecutor(max_workers=max_workers) if (needs_pool and max_workers != 1) else None
+    frames = []
+    try:
+        for config in models:
+            forecasts = model_forecasts(config, y, csum, starts, ends, horizon, refit_every, pool)
+            errors = forecasts - actual
+            frames.append(pd.DataFrame({'model_name': s.model_name(config),
+                                        'origin': dates[ends],
+                                        'rmse': np.sqrt(np.mean(errors ** 2, axis=1)),
+                                        'mae': np.mean(np.abs(errors), axis=1)}))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    
+    return pd.concat(frames, ignore_index=True)
+
+def summarize_backtest(errors, metric='rmse'):
+    '''This function summarizes the distribution of backtest errors per model, best mean first'''
+    summary = errors.groupby('model_name')[metric].describe(percentiles=[0.1, 0.5, 0.9])
+    
+    return summary.sort_values('mean')
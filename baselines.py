@@ -0,0 +1,70 @@
+import pandas as pd
+import numpy as np
+
+
+##------------------------Baseline Forecasts--------------------------##
+
+def moving_average_levels(y, windows):
+    '''This function returns the last N-day moving average of y for every N in windows, from a single
+    cumulative sum. y is a 1-D array of daily values or a 2-D (day x series) array; the result has
+    one row per window (and one column per series). Windows longer than y give NaN'''
+    y = np.asarray(y, dtype=float)
+    windows = np.asarray(windows, dtype=int)
+    csum = np.concatenate([np.zeros((1,) + y.shape[1:]), np.cumsum(y, axis=0)])
+    valid = (windows >= 1) & (windows <= len(y))
+    #Sum of the last N values is the total minus the cumulative sum N days from the end
+    start = np.where(valid, len(y) - windows, 0)
+    levels = (csum[-1] - csum[start]) / np.where(valid, windows, 1).reshape((-1,) + (1,) * (y.ndim - 1))
+    levels[~valid] = np.nan
+    
+    return levels
+
+def ewma_levels(y, alphas):
+    '''This function returns the final exponentially weighted moving average of y for every
+    smoothing factor in alphas (the same value as y.ewm(alpha=a).mean() at the last day),
+    as one weighted sum per alpha'''
+    y = np.asarray(y, dtype=float)
+    alphas = np.asarray(alphas, dtype=float)
+    #Weight of each day for each alpha, newest day weighted 1
+    ages = np.arange(len(y))[::-1]
+    weights = (1 - alphas[:, None]) ** ages[None, :]
+    
+    return np.tensordot(weights, y, axes=(1, 0)) / weights.sum(axis=1).reshape((-1,) + (1,) * (y.ndim - 1))
+
+def rmse_constant(actual, levels):
+    '''This function returns the RMSE of forecasting every day of actual with each constant in
+    levels, for all levels at once: mean((a - L)^2) = mean(a^2) - 2 L mean(a) + L^2'''
+    actual = np.asarray(actual, dtype=float)
+    if len(actual) == 0:
+        return np.full(np.shape(levels), np.nan)
+    mse = (actual ** 2).mean(axis=0) - 2 * levels * actual.mean(axis=0) + levels ** 2
+    
+    return np.sqrt(np.maximum(mse, 0))
+
+##------------------------Evaluation--------------------------##
+
+def baseline_levels(y, windows=range(7, 366), alphas=(0.05, 0.1, 0.2, 0.3, 0.5)):
+    '''This function returns (model names, forecast levels) for the simple average, an N-day moving
+    average for every window and an EWMA for every alpha'''
+    names = ['simple_average']
+    names += [f'{window} d moving_average' for window in windows]
+    names += [f'ewma alpha {alpha}' for alpha in alphas]
+    y = np.asarray(y, dtype=float)
+    levels = np.concatenate([y.mean(axis=0)[None],
+                             moving_average_levels(y, list(windows)),
+                             ewma_levels(y, list(alphas))])
+    
+    return names, levels
+
+def eval_baselines(train, validate, test=None, windows=range(7, 366), alphas=(0.05, 0.1, 0.2, 0.3, 0.5),
+                   target_var='count_of_crime'):
+    '''This function scores every baseline forecast (simple average, moving averages and EWMAs fit on
+    train) against train, validate and test at once, and returns a scores dataframe'''
+    names, levels = baseline_levels(train[target_var], windows, alphas)
+    scores = pd.DataFrame({'model_name': names,
+                           'train_score': rmse_constant(train[target_var], levels),
+                           'validate_score': rmse_constant(validate[target_var], levels)})
+    if test is not None:
+        scores['test_score'] = rmse_constant(test[target_var], levels)
+    
+    return scores
@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import tracemalloc
+import threading
+import subprocess
+import http.client
+from contextlib import contextmanager
+import pandas as pd
+import numpy as np
+import wrangle as w
+import cube as c
+import explore as e
+import model as m
+import synthetic as syn
+import serve
+
+
+##------------------------Baselines----------------------##
+
+def legacy_clean_data(df):
+    '''The original regex-based, row-by-row cleaning, kept as the baseline that clean_data
+    is benchmarked against'''
+    df.columns = df.columns.str.lower()
+    df = df.astype({col: object for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+    df = df.replace(r'^\s*$', np.nan, regex=True)
+    df['offense_code_group'] = df['offense_code_group'].fillna("unknown")
+    df.loc[df["shooting"] == "Y", "shooting"] = 1
+    df['shooting'] = df['shooting'].fillna(0)
+    df['shooting'] = df['shooting'].astype(int)
+    df['ucr_part'] = df['ucr_part'].fillna("unknown")
+    df['reporting_area'] = pd.to_numeric(df['reporting_area'], errors='coerce').fillna(0).astype(int)
+    df['offense_code_group'] = df['offense_code_group'].str.lower()
+    df['offense_description'] = df['offense_description'].str.lower()
+    df['occurred_on_date'] = w.parse_dates(df['occurred_on_date'])
+    
+    return df
+
+##------------------------Benchmarks----------------------##
+
+def time_call(func, *args, repeat=3, **kwargs):
+    '''This function returns the best wall time in seconds of repeat calls to func'''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    
+    return best
+
+def bench_clean(raw, repeat=3):
+    '''This function times legacy_clean_data against clean_data on copies of the raw acquired
+    dataframe and returns a dataframe of seconds and rows per second for each'''
+    results = []
+    for name, func in [('legacy_clean_data', legacy_clean_data), ('clean_data', w.clean_data)]:
+        seconds = time_call(lambda: func(raw.copy()), repeat=repeat)
+        results.append({'function': name, 'rows': len(raw), 'seconds': round(seconds, 4),
+                        'rows_per_sec': round(len(raw) / seconds)})
+    
+    return pd.DataFrame(results)
+
+#Libraries the data/statistics core must not load at import time
+HEAVY_MODULES = ['matplotlib', 'seaborn', 'statsmodels', 'scipy', 'sklearn']
+#Modules a headless forecasting worker imports
+CORE_MODULES = ['wrangle', 'cube', 'explore', 'model', 'baselines', 'sweep', 'backtest', 'hierarchy', 'spatial',
+                'instrument', 'store', 'serve']
+
+def bench_import(module, repeat=3):
+    '''This function imports module in fresh interpreters and returns the best wall time in seconds
+    and the heavy libraries that import loaded'''
+    code = (f'import sys, time, json; start = time.perf_counter(); import {module}; '
+            f'print(json.dumps([time.perf_counter() - start, sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)]))')
+    best, loaded = np.inf, []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        seconds, loaded = json.loads(out.strip().splitlines()[-1])
+        best = min(best, seconds)
+    
+    return best, loaded
+
+def bench_imports(modules=CORE_MODULES, repeat=3):
+    '''This function returns a dataframe of the import time and heavy libraries loaded for each module'''
+    rows = []
+    for module in modules:
+        seconds, loaded = bench_import(module, repeat)
+        rows.append({'module': module, 'seconds': round(seconds, 4), 'heavy_modules': loaded})
+    
+    return pd.DataFrame(rows)
+
+def check_imports(modules=CORE_MODULES, budget=1.0):
+    '''This function guards against import-time regressions: it raises AssertionError if importing
+    any core module loads a plotting/modeling library or takes longer than budget seconds'''
+    results = bench_imports(modules, repeat=1)
+    heavy = results[results['heavy_modules'].str.len() > 0]
+    assert heavy.empty, f'core modules load heavy libraries at import:\n{heavy}'
+    slow = results[results['seconds'] > budget]
+    assert slow.empty, f'core modules exceed the {budget}s import budget:\n{slow}'
+    
+    return results
+
+##------------------------Pipeline Benchmarks----------------------##
+
+#Total synthetic rows of the default pipeline benchmark scales, small enough for get_clean_data to
+#hold in memory. The seasonal Holt model needs a fraud report on nearly every train day, which
+#takes about a million rows; below that its stage is recorded as failed
+PIPELINE_SCALES = [10_000, 100_000, 1_000_000]
+
+def pipeline_stages():
+    '''This function returns the benchmarked pipeline stages in order, as (stage, function of the
+    results of the earlier stages)'''
+    return [
+        ('aggregate_csv', lambda r: w.aggregate_csv()),
+        ('get_clean_data (build cache)', lambda r: w.get_clean_data()),
+        ('get_clean_data (cached)', lambda r: w.get_clean_data()),
+        ('create_fraud_df', lambda r: w.create_fraud_df(r['get_clean_data (cached)'])),
+        ('train_validate_test_split', lambda r: e.train_validate_test_split(r['create_fraud_df'])),
+        ('post_pandemic_split', lambda r: m.post_pandemic_split(r['create_fraud_df'])),
+        ('eval_timeseries_models', lambda r: m.eval_timeseries_models(*r['train_validate_test_split'])),
+        ('evaluate_holt_models', lambda r: m.evaluate_holt_models(*r['train_validate_test_split'])),
+    ]
+
+@contextmanager
+def working_directory(path):
+    '''This context manager runs its block with path as the working directory, where the pipeline
+    reads and writes its files'''
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+
+def reset_outputs():
+    '''This function removes the combined csv, the parquet cache and the model session cache from
+    the working directory, so the next pipeline run starts cold'''
+    if os.path.exists('boston_crime.csv'):
+        os.remove('boston_crime.csv')
+    shutil.rmtree(w.CACHE_DIR, ignore_errors=True)
+    m.session_cache.clear()
+
+def run_stages(memory=False):
+    '''This function runs every pipeline stage once in the working directory and returns a list of
+    dicts with each stage's seconds, and with memory its peak traced allocation in MB. Memory is
+    traced with tracemalloc, which slows the stages, so time and memory come from separate runs.
+    A stage that raises (or needs the result of one that did) is reported in the error column
+    rather than raised, and the stages after it still run'''
+    results, rows, failed = {}, [], set()
+    for stage, func in pipeline_stages():
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        row = {'stage': stage, 'error': None}
+        try:
+            results[stage] = func(results)
+        except Exception as err:
+            needed = err.args[0] if isinstance(err, KeyError) and err.args else None
+            row['error'] = f'skipped: needs {needed}' if needed in failed else f'{type(err).__name__}: {err}'
+            failed.add(stage)
+        row['seconds'] = time.perf_counter() - start
+        if memory:
+            row['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        rows.append(row)
+    
+    return rows
+
+def bench_pipeline(rows, memory=True, seed=0, directory=None):
+    '''This function generates rows of synthetic yearly files (see synthetic.generate) in directory
+    (a temporary one by default), runs the pipeline on them from cold, and returns a dataframe of
+    seconds, rows per second and, with memory, peak MB for each stage. Peak memory counts the
+    allocations of this process only, not the workers of aggregate_csv's process pool'''
+    with tempfile.TemporaryDirectory() as tmp, working_directory(directory or tmp):
+        syn.generate(rows, seed=seed)
+        reset_outputs()
+        results = pd.DataFrame(run_stages())
+        if memory:
+            reset_outputs()
+            results['peak_mb'] = pd.DataFrame(run_stages(memory=True))['peak_mb'].round(1)
+        reset_outputs()
+    results.insert(0, 'rows', rows)
+    #Failed stages have no meaningful time
+    results['seconds'] = results['seconds'].where(results['error'].isna()).round(4)
+    results.insert(4, 'rows_per_sec', (rows / results['seconds']).round().astype('Int64'))
+    results = results[[col for col in results.columns if col != 'error'] + ['error']]
+    
+    return results
+
+def bench_scales(scales=PIPELINE_SCALES, memory=True, seed=0):
+    '''This function runs bench_pipeline at every scale and returns one dataframe, to compare how
+    each stage grows with the data'''
+    return pd.concat([bench_pipeline(rows, memory, seed) for rows in scales], ignore_index=True)
+
+def check_stream_cube(rows=200_000, categories=('fraud', 'larceny'), chunksize=20_000, seed=0):
+    '''This function guards the streaming path against drifting from the cached one: it generates
+    rows of synthetic yearly files and raises AssertionError unless stream_daily_cube, in chunks of
+    chunksize rows, counts exactly what build_daily_cube counts on get_clean_data()'''
+    with tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        syn.generate(rows, seed=seed)
+        streamed = c.stream_daily_cube(categories=list(categories), chunksize=chunksize)
+        cached = c.build_daily_cube(w.get_clean_data(), list(categories))
+    assert streamed.dates.equals(cached.dates), 'streamed and cached cubes cover different days'
+    assert list(streamed.districts) == list(cached.districts), 'streamed and cached cubes differ in districts'
+    totals = pd.DataFrame({'streamed': streamed.counts.sum(axis=(1, 2, 3, 4)),
+                           'cached': cached.counts.sum(axis=(1, 2, 3, 4))}, index=cached.categories)
+    assert np.array_equal(streamed.counts, cached.counts), f'streamed and cached counts differ:\n{totals}'
+    
+    return totals
+
+##------------------------Serving Benchmarks----------------------##
+
+def serving_queries(snapshot, n, seed=0):
+    '''This function returns n random forecast and history request paths over the categories and
+    districts of a snapshot'''
+    rng = np.random.default_rng(seed)
+    categories, districts = list(snapshot.categories), list(snapshot.districts)
+    last = np.datetime64(snapshot.date_labels[snapshot.counts.shape[1] - 1])
+    paths = []
+    for _ in range(n):
+        category, district = rng.choice(categories), rng.choice(districts)
+        if rng.random() < 0.5:
+            paths.append(f'/forecast?category={category}&district={district}&days={rng.integers(1, 31)}')
+        else:
+            start = last - rng.integers(7, 366)
+            paths.append(f'/history?category={category}&district={district}&start={start}&end={start + 30}')
+    
+    return paths
+
+def latency_summary(layer, latencies, seconds, errors=0):
+    '''This function summarizes request latencies (seconds) as percentiles in milliseconds'''
+    ms = np.asarray(latencies) * 1000
+    
+    return {'layer': layer, 'requests': len(ms), 'errors': errors, 'rps': round(len(ms) / seconds),
+            'p50_ms': round(np.percentile(ms, 50), 3), 'p99_ms': round(np.percentile(ms, 99), 3),
+            'max_ms': round(ms.max(), 3)}
+
+def bench_snapshot_queries(snapshot, n=10_000):
+    '''This function times forecast and history queries against a serve.Snapshot in process,
+    without HTTP'''
+    calls = []
+    for path in serving_queries(snapshot, n):
+        route, query = path[1:].split('?')
+        params = dict(item.split('=') for item in query.split('&'))
+        if route == 'forecast':
+            calls.append((snapshot.forecast, (params['category'], params['district'], int(params['days']))))
+        else:
+            calls.append((snapshot.history, (params['category'], params['district'], params['start'], params['end'])))
+    latencies = []
+    begin = time.perf_counter()
+    for func, args in calls:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    
+    return latency_summary('snapshot', latencies, time.perf_counter() - begin)
+
+def load_test(host, port, paths, rate=300, concurrency=16):
+    '''This function sends paths to a forecast server at a fixed rate (requests per second) from
+    concurrency client threads, each with its own keep-alive connection. Request i is due at i / rate
+    seconds and its latency is counted from when it was due, so a server that falls behind shows it
+    in the tail. Returns the latencies in seconds, the wall time and the count of non-200 responses'''
+    latencies = [None] * len(paths)
+    errors = [0] * concurrency
+    begin = time.perf_counter()
+
+    def client(worker):
+        connection = http.client.HTTPConnection(host, port)
+        for i in range(worker, len(paths), concurrency):
+            due = begin + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            connection.request('GET', paths[i])
+            response = connection.getresponse()
+            response.read()
+            latencies[i] = time.perf_counter() - due
+            errors[worker] += response.status != 200
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    return latencies, time.perf_counter() - begin, sum(errors)
+
+def bench_serving(path=serve.SNAPSHOT_PATH, requests=3000, rate=300, concurrency=16, hot_swap=True):
+    '''This function measures the forecast server on a snapshot file: in-process query latency, then
+    p50/p99 HTTP latency of a load test at rate requests per second against a local server. With
+    hot_swap the snapshot file is replaced halfway through the load test, so the numbers include a
+    hot reload; every request must still succeed. Returns a dataframe with a row per layer'''
+    server = serve.start_server(path, port=0, watch_interval=0.2)
+    host, port = server.server_address
+    paths = serving_queries(server.snapshot, requests)
+    results = [bench_snapshot_queries(server.snapshot)]
+    if hot_swap:
+        #Rewrite the same snapshot under a new mtime, as the nightly refresh would
+        swap = threading.Timer(requests / rate / 2, lambda: os.replace(shutil.copy(path, f'{path}.swap'), path))
+        swap.start()
+    latencies, seconds, errors = load_test(host, port, paths, rate, concurrency)
+    results.append(latency_summary('http', latencies, seconds, errors))
+    results[-1]['reloads'] = server.reloads
+    server.shutdown()
+    server.server_close()
+    
+    return pd.DataFrame(results)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['pipeline']:
+        #python benchmark.py pipeline [rows ...]
+        print(bench_scales([int(rows) for rows in sys.argv[2:]] or PIPELINE_SCALES).to_string())
+    elif sys.argv[1:2] == ['check']:
+        #python benchmark.py check: the import and streaming guards
+        print(check_imports())
+        print(check_stream_cube())
+    elif sys.argv[1:2] == ['serving']:
+        #python benchmark.py serving [snapshot path], after python serve.py build
+        print(bench_serving(*sys.argv[2:3]).to_string())
+    else:
+        print(bench_imports())
+        print(bench_clean(w.acquire_data()))
@@ -0,0 +1,240 @@
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+import wrangle as w
+import memo
+import instrument
+
+
+##------------------------Daily Count Cube----------------------##
+
+class DailyCube:
+    '''Daily crime counts keyed by category x date x district, optionally split further by
+    shooting and UCR part. counts has shape (category, date, district, shooting, ucr_part);
+    axes that weren't split have length one. Dates run from the first to the last day in
+    the data, including days with no crimes'''
+
+    def __init__(self, counts, categories, dates, districts, shootings, ucr_parts,
+                 split_shooting=False, split_ucr=False):
+        self.counts = counts
+        self.split_shooting = split_shooting
+        self.split_ucr = split_ucr
+        self.categories = pd.Index(categories)
+        self.dates = pd.DatetimeIndex(dates, name='date')
+        self.districts = pd.Index(districts)
+        self.shootings = pd.Index(shootings)
+        self.ucr_parts = pd.Index(ucr_parts)
+
+    def select(self, axis_labels, value):
+        '''This function returns the positions on one axis of a label, a list of labels,
+        or every label if value is None'''
+        if value is None:
+            return slice(None)
+        positions = axis_labels.get_indexer(np.atleast_1d(value))
+        if (positions < 0).any():
+            raise KeyError(f'{value!r} not in {list(axis_labels)}')
+        
+        return positions
+
+    def daily(self, category='all', district=None, shooting=None, ucr_part=None):
+        '''This function returns the 1-D array of daily counts for one category, summed over
+        every district/shooting/ucr_part not selected'''
+        cells = self.counts[self.select(self.categories, category)].sum(axis=0)
+        cells = cells[:, self.select(self.districts, district)]
+        cells = cells[:, :, self.select(self.shootings, shooting)]
+        cells = cells[:, :, :, self.select(self.ucr_parts, ucr_part)]
+        
+        return cells.reshape(len(self.dates), -1).sum(axis=1)
+
+    def series(self, category='all', district=None, shooting=None, ucr_part=None, keep_zeros=False):
+        '''This function returns a dataframe of daily counts, with the target column
+        count_of_crime and a date index, the same shape as grouping the incident rows by date.
+        Like that groupby, days with no crimes are dropped unless keep_zeros is True'''
+        counts = self.daily(category, district, shooting, ucr_part)
+        df = pd.DataFrame({'count_of_crime': counts}, index=self.dates)
+        if not keep_zeros:
+            df = df[counts > 0]
+        
+        return df
+
+    def update(self, df):
+        '''This function adds the counts of new incident rows in place. df must be the same kind of
+        dataframe the cube was built from; the date range and labels grow as needed'''
+        self.merge(build_daily_cube(df, list(self.categories[1:]), self.split_shooting, self.split_ucr))
+
+    def rebuild(self, df):
+        '''This function replaces the counts in place with those of df, keeping the categories and
+        splits, for when the data changed in a way update can't add'''
+        self.__dict__.update(build_daily_cube(df, list(self.categories[1:]), self.split_shooting,
+                                              self.split_ucr).__dict__)
+
+    def merge(self, other):
+        '''This function adds the counts of another cube with the same categories and splits in place,
+        growing the date range and labels as needed'''
+        dates = self.dates.union(other.dates)
+        dates = pd.date_range(dates.min(), dates.max(), freq='D', name='date') if len(dates) else dates
+        districts = self.districts.append(other.districts.difference(self.districts))
+        shootings = self.shootings.append(other.shootings.difference(self.shootings))
+        ucr_parts = self.ucr_parts.append(other.ucr_parts.difference(self.ucr_parts))
+        if (len(dates), len(districts), len(shootings), len(ucr_parts)) != self.counts.shape[1:]:
+            #Grow the cube, copying the old counts into place
+            counts = np.zeros((len(self.categories), len(dates), len(districts), len(shootings),
+                               len(ucr_parts)), dtype=np.int32)
+            counts[self.positions(dates, districts, shootings, ucr_parts)] = self.counts
+            self.counts, self.dates = counts, dates
+            self.districts, self.shootings, self.ucr_parts = districts, shootings, ucr_parts
+        np.add.at(self.counts, other.positions(self.dates, self.districts, self.shootings, self.ucr_parts),
+                  other.counts)
+
+    def positions(self, dates, districts, shootings, ucr_parts):
+        '''This function returns the open-mesh index placing this cube's cells into a cube
+        with the given (larger) axes'''
+        return np.ix_(np.arange(len(self.categories)), dates.get_indexer(self.dates),
+                      districts.get_indexer(self.districts), shootings.get_indexer(self.shootings),
+                      ucr_parts.get_indexer(self.ucr_parts))
+
+    def matrix(self, category='all', by='district'):
+        '''This function returns a date x label dataframe of daily counts for one category,
+        with one column per district, shooting value or ucr part'''
+        axis = {'district': 1, 'shooting': 2, 'ucr_part': 3}[by]
+        labels = {'district': self.districts, 'shooting': self.shootings, 'ucr_part': self.ucr_parts}[by]
+        cells = self.counts[self.categories.get_loc(category)]
+        other = tuple(a for a in (1, 2, 3) if a != axis)
+        
+        return pd.DataFrame(cells.sum(axis=other), index=self.dates, columns=labels)
+
+def encode(values):
+    '''This function integer-encodes a column, returning (codes, labels). Missing values get
+    their own "unknown" label at the end instead of code -1'''
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, labels = values.cat.codes.to_numpy().astype(np.int64), values.cat.categories
+    else:
+        codes, labels = pd.factorize(values, sort=True)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(labels), codes)
+        labels = labels.append(pd.Index(['unknown']))
+    
+    return codes, pd.Index(labels)
+
+@instrument.stage()
+def build_daily_cube(df, categories=None, split_shooting=False, split_ucr=False, index=None):
+    '''This function counts crimes per day in one bincount over integer-encoded
+    (date, district, shooting, ucr_part) keys. df is either the clean crime dataframe or a
+    category dataframe from create_offense_df (dates in the index). Counts are always made for
+    "all" rows, plus each offense category in categories, using the offense index'''
+    if 'occurred_on_date' in df.columns:
+        dates = df['occurred_on_date'].to_numpy()
+    else:
+        dates = df.index.to_numpy()
+    #Day number since the first day in the data
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    first = days.min() if len(days) else 0
+    days = days - first
+    n_days = (days.max() + 1) if len(days) else 0
+    if 'district' in df.columns:
+        district, districts = encode(df['district'])
+    else:
+        #A frame without districts counts every row under one district
+        district, districts = np.zeros(len(df), dtype=np.int64), pd.Index(['all'])
+    if split_shooting:
+        shooting, shootings = encode(df['shooting'])
+    else:
+        shooting, shootings = np.zeros(len(df), dtype=np.int64), pd.Index(['all'])
+    if split_ucr:
+        ucr, ucr_parts = encode(df['ucr_part'])
+    else:
+        ucr, ucr_parts = np.zeros(len(df), dtype=np.int64), pd.Index(['all'])
+    shape = (n_days, len(districts), len(shootings), len(ucr_parts))
+    keys = np.ravel_multi_index((days, district, shooting, ucr), shape) if len(df) else days
+    size = int(np.prod(shape))
+    #Counts for every row, then for each category's rows only
+    cube = [np.bincount(keys, minlength=size)]
+    labels = ['all']
+    if categories:
+        if index is None:
+            index = w.get_offense_index(df)
+        for category in categories:
+            cube.append(np.bincount(keys[index.rows(category)], minlength=size))
+            labels.append(category)
+    counts = np.stack(cube).astype(np.int32).reshape((len(labels),) + shape)
+    date_index = pd.to_datetime(first + np.arange(n_days), unit='D')
+    
+    return DailyCube(counts, labels, date_index, districts, shootings, ucr_parts,
+                     split_shooting, split_ucr)
+
+def get_daily_cube(df, categories=None, split_shooting=False, split_ucr=False):
+    '''This function returns the DailyCube of df, building it the first time df is seen with
+    these arguments. Build a new cube with build_daily_cube if df is modified in place'''
+    key = ('daily_cube', tuple(categories or ()), split_shooting, split_ucr)
+    
+    return memo.per_frame_cache(df, key, lambda: build_daily_cube(df, categories, split_shooting, split_ucr))
+
+def daily_counts(df, category='all', **kwargs):
+    '''This function returns the daily count_of_crime dataframe of df (one category of it, if df
+    is the clean crime dataframe) from its cached cube'''
+    categories = None if category == 'all' else [category]
+    
+    return get_daily_cube(df, categories).series(category, **kwargs)
+
+##------------------------Streaming----------------------##
+
+#Columns the streaming pipeline needs from the yearly files
+STREAM_COLUMNS = ['incident_number', 'offense_code', 'offense_description', 'district',
+                  'occurred_on_date', 'shooting', 'ucr_part']
+
+def stream_file_cube(path, category=None, categories=None, chunksize=100_000,
+                     split_shooting=False, split_ucr=False):
+    '''This function streams one yearly file through cleaning, the optional category filter and
+    the daily count cube, one chunk at a time, and returns the file's cube (None if the filter
+    left no rows). Rows repeating an incident_number and offense_code already seen in the file are
+    dropped, as build_cache does'''
+    daily_cube = None
+    #Incident keys of the rows counted so far
+    seen = set()
+    for chunk in w.iter_clean_chunks(path, chunksize, STREAM_COLUMNS):
+        #As strings, so missing values compare equal as they do in drop_duplicates
+        keys = list(zip(*(chunk[col].astype(str) for col in w.INCIDENT_KEY)))
+        new = np.array([key not in seen for key in keys], dtype=bool)
+        chunk = chunk[new & ~pd.Series(keys).duplicated().to_numpy()]
+        seen.update(keys)
+        if category is not None:
+            chunk = w.create_offense_df(chunk, category, w.OffenseIndex(chunk))
+        if not len(chunk):
+            continue
+        chunk_cube = build_daily_cube(chunk, categories, split_shooting, split_ucr)
+        if daily_cube is None:
+            daily_cube = chunk_cube
+        else:
+            daily_cube.merge(chunk_cube)
+    
+    return daily_cube
+
+def stream_daily_cube(pattern=w.CSV_PATTERN, category=None, categories=None, chunksize=100_000,
+                      split_shooting=False, split_ucr=False, max_workers=1):
+    '''This function builds the daily count cube straight from the yearly files without loading them:
+    each file is read in chunks of chunksize rows, cleaned with the same rules as get_clean_data,
+    optionally filtered to one offense category (as create_offense_df would) and folded into the cube.
+    Peak memory is a few chunks plus the cube, however much history there is. With max_workers
+    above one, files are streamed in parallel and their cubes merged'''
+    paths = w.get_yearly_files(pattern)
+    if not paths:
+        raise FileNotFoundError(f'No files match {pattern!r}')
+    args = (category, categories, chunksize, split_shooting, split_ucr)
+    if max_workers == 1:
+        cubes = (stream_file_cube(path, *args) for path in paths)
+        return fold_cubes(cubes)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return fold_cubes(pool.map(stream_file_cube, paths, *[[arg] * len(paths) for arg in args]))
+
+def fold_cubes(cubes):
+    '''This function merges an iterable of cubes (skipping None) into the first one'''
+    daily_cube = None
+    for other in cubes:
+        if other is None:
+            continue
+        if daily_cube is None:
+            daily_cube = other
+        else:
+            daily_cube.merge(other)
+    
+    return daily_cube
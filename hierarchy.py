@@ -0,0 +1,108 @@
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import wrangle as w
+import baselines as b
+import sweep as s
+
+
+##------------------------Series Matrix--------------------------##
+
+def area_matrix(df, category=None, level='reporting_area'):
+    '''This function counts crimes per day for every (district, reporting area) pair in one bincount,
+    and returns a gap-free date x series dataframe with (district, level) columns. Each reporting
+    area is kept under the district it was reported in, so the series nest strictly into districts.
+    df is the clean crime dataframe; category limits it to one offense category. level is the column
+    nested under district, so it can't be district itself. A category with no rows gives an empty matrix'''
+    if level == 'district':
+        raise ValueError('level must be a column nested under district, such as "reporting_area", not "district"')
+    if category is not None:
+        df = df.take(w.get_offense_index(df).rows(category))
+    if not len(df):
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='date'),
+                            columns=pd.MultiIndex.from_tuples([], names=['district', level]), dtype=np.int64)
+    days = df['occurred_on_date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    first = days.min()
+    days = days - first
+    pairs = pd.MultiIndex.from_arrays([df['district'].astype(object).fillna('unknown').to_numpy(),
+                                       df[level].to_numpy()], names=['district', level])
+    series, labels = pd.factorize(pairs, sort=True)
+    n_days = days.max() + 1
+    counts = np.bincount(days * len(labels) + series, minlength=n_days * len(labels))
+    dates = pd.DatetimeIndex(pd.to_datetime(first + np.arange(n_days), unit='D'), name='date')
+    
+    return pd.DataFrame(counts.reshape(n_days, len(labels)), index=dates,
+                        columns=pd.MultiIndex.from_tuples(labels, names=['district', level]))
+
+##------------------------Batch Forecasts--------------------------##
+
+def fit_series_forecast(config, y, horizon):
+    '''This function fits one configuration to one series and returns its forecast, falling back to
+    the series mean if the fit fails (e.g. an all-zero reporting area)'''
+    try:
+        return s.fit_forecast(config, y, horizon)[1]
+    except Exception:
+        return np.full(horizon, y.mean())
+
+def forecast_matrix(Y, horizon, config=None, max_workers=None):
+    '''This function forecasts every column of the (day x series) array Y for the next horizon days
+    with one configuration (sweep.model_grid style). The simple average and moving averages are
+    computed for all series at once; statsmodels models are fit per series across a process pool'''
+    config = {'model': 'simple_average'} if config is None else config
+    Y = np.asarray(Y, dtype=float)
+    if config['model'] in ('simple_average', 'moving_average'):
+        window = len(Y) if config['model'] == 'simple_average' else min(config['window'], len(Y))
+        levels = b.moving_average_levels(Y, [window])[0]
+        return np.repeat(levels[None, :], horizon, axis=0)
+    columns = list(Y.T)
+    n = len(columns)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        forecasts = list(pool.map(fit_series_forecast, [config] * n, columns, [horizon] * n,
+                                  chunksize=max(1, n // 64)))
+    
+    return np.column_stack(forecasts)
+
+##------------------------Reconciliation--------------------------##
+
+def reconcile(area_forecasts, district_forecasts=None, citywide_forecast=None):
+    '''This function makes forecasts coherent across the hierarchy and returns a dict of area,
+    district and citywide forecast dataframes. Without higher-level forecasts it is bottom-up: districts
+    and the city are the sums of their areas. Given district (and citywide) forecasts it is top-down:
+    districts are scaled to sum to the citywide forecast and areas scaled to sum to their district,
+    keeping each area's share of its district'''
+    areas = area_forecasts
+    if citywide_forecast is not None and district_forecasts is not None:
+        total = district_forecasts.sum(axis=1).replace(0, np.nan)
+        district_forecasts = district_forecasts.mul(citywide_forecast / total, axis=0).fillna(0)
+    if district_forecasts is not None:
+        sums = areas.T.groupby(level='district').sum().T.replace(0, np.nan)
+        scale = (district_forecasts[sums.columns] / sums).fillna(0)
+        #Spread each district's scale factor over its areas
+        areas = areas * scale.reindex(columns=areas.columns.get_level_values('district')).to_numpy()
+    districts = areas.T.groupby(level='district').sum().T
+    
+    return {'area': areas, 'district': districts, 'citywide': districts.sum(axis=1).rename('count_of_crime')}
+
+def forecast_hierarchy(df, horizon=30, config=None, category=None, level='reporting_area', method='bottom_up',
+                       max_workers=None):
+    '''This function forecasts every (district, reporting area) series of df for the next horizon days
+    in one batch and reconciles them. method is "bottom_up" (areas only, summed upward) or "top_down"
+    (districts and the city are forecast too, and areas are scaled to agree with them). Returns a
+    dict of area, district and citywide forecast dataframes indexed by the forecast dates'''
+    Y = area_matrix(df, category, level)
+    if Y.empty:
+        raise ValueError(f'no rows to forecast for category {category!r}')
+    dates = pd.date_range(Y.index[-1] + pd.Timedelta(days=1), periods=horizon, freq='D', name='date')
+    areas = pd.DataFrame(forecast_matrix(Y.to_numpy(), horizon, config, max_workers), index=dates,
+                         columns=Y.columns)
+    if method == 'bottom_up':
+        return reconcile(areas)
+    if method != 'top_down':
+        raise ValueError(f'method must be "bottom_up" or "top_down", not {method!r}')
+    district_Y = Y.T.groupby(level='district').sum().T
+    districts = pd.DataFrame(forecast_matrix(district_Y.to_numpy(), horizon, config, max_workers),
+                             index=dates, columns=district_Y.columns)
+    citywide = pd.Series(forecast_matrix(Y.sum(axis=1).to_numpy()[:, None], horizon, config, max_workers)[:, 0],
+                         index=dates)
+    
+    return reconcile(areas, districts, citywide)
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import atexit
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+
+##------------------------State----------------------##
+
+#Environment variable that turns profiling on for the whole process; its value is the trace
+#file written at exit (.json or .csv)
+ENV_VAR = 'BOSTON_CRIME_PROFILE'
+
+#Records of the active trace, None while profiling is off
+_records = None
+#Open spans, innermost last, each with its start and the peak memory seen inside it
+_stack = []
+#Whether the active trace measures memory, and when it started
+_memory = False
+_origin = 0.0
+
+def enabled():
+    '''This function returns whether profiling is on'''
+    return _records is not None
+
+def start(memory=True):
+    '''This function turns profiling on with an empty trace. memory traces allocations with
+    tracemalloc to record each stage's peak memory, which slows the traced code'''
+    global _records, _memory, _origin
+    _records, _memory, _origin = [], memory, time.perf_counter()
+    _stack.clear()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def stop():
+    '''This function turns profiling off and returns the records of the trace'''
+    global _records
+    records, _records = _records or [], None
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    
+    return records
+
+@contextmanager
+def profiling(path=None, memory=True):
+    '''This context manager profiles its block and yields the list the records are appended to.
+    With path the trace is written there on exit (see write_trace)'''
+    start(memory)
+    records = _records
+    try:
+        yield records
+    finally:
+        stop()
+        if path is not None:
+            write_trace(records, path)
+
+##------------------------Spans----------------------##
+
+def count_rows(value):
+    '''This function returns the rows of a dataframe, series or array, the summed rows of a tuple
+    of them (such as a train/validate/test split), or None'''
+    if isinstance(value, tuple):
+        counts = [count_rows(item) for item in value]
+        return None if None in counts else sum(counts)
+    if hasattr(value, 'shape') and len(getattr(value, 'shape', ())) > 0:
+        return int(value.shape[0])
+    
+    return None
+
+@contextmanager
+def span(name, detail=None, rows_in=None):
+    '''This context manager records the wall time, CPU time and peak memory above the starting
+    point of its block as one stage of the trace. It yields a dict the block can set rows_out in.
+    Does nothing while profiling is off'''
+    if _records is None:
+        yield {}
+        return
+    if _memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if _stack:
+            _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+    else:
+        current = 0
+    frame = {'memory': current, 'peak': current}
+    record = {'stage': name, 'detail': detail, 'depth': len(_stack),
+              'parent': _stack[-1]['record']['stage'] if _stack else None,
+              'start_s': time.perf_counter() - _origin, 'rows_in': rows_in, 'rows_out': None}
+    frame['record'] = record
+    _stack.append(frame)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_s'] = time.perf_counter() - wall
+        record['cpu_s'] = time.process_time() - cpu
+        _stack.pop()
+        if _memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = (peak - frame['memory']) / 2 ** 20
+            if _stack:
+                _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+        _records.append(record)
+
+def stage(name=None, describe=None):
+    '''This decorator records every call of a function as a stage named name (module.function by
+    default), with the rows of its first argument and of its result. describe, called with the
+    function's arguments, returns a detail such as the model fitted. While profiling is off the
+    only overhead is one check per call'''
+    def decorator(func):
+        label = name or f'{func.__module__}.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _records is None:
+                return func(*args, **kwargs)
+            detail = describe(*args, **kwargs) if describe is not None else None
+            with span(label, detail, count_rows(args[0]) if args else None) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = count_rows(result)
+            return result
+        return wrapper
+    
+    return decorator
+
+##------------------------Export----------------------##
+
+#Columns of a trace, in order
+TRACE_COLUMNS = ['stage', 'detail', 'depth', 'parent', 'start_s', 'wall_s', 'cpu_s', 'peak_mb',
+                 'rows_in', 'rows_out']
+
+def trace_frame(records):
+    '''This function returns the records of a trace as a dataframe in the order the stages started'''
+    import pandas as pd
+    trace = pd.DataFrame(records, columns=TRACE_COLUMNS)
+    
+    return trace.sort_values('start_s', kind='stable').reset_index(drop=True)
+
+def write_trace(records, path):
+    '''This function writes the records of a trace to path, as JSON for a .json path and CSV otherwise'''
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump([{column: record.get(column) for column in TRACE_COLUMNS} for record in records], f, indent=1)
+    else:
+        trace_frame(records).to_csv(path, index=False)
+
+def read_trace(path):
+    '''This function reads a trace written by write_trace back as a dataframe'''
+    import pandas as pd
+    if path.endswith('.json'):
+        with open(path) as f:
+            return trace_frame(json.load(f))
+    
+    return pd.read_csv(path)
+
+def summarize_trace(trace):
+    '''This function totals a trace dataframe per stage and detail: calls, wall and CPU seconds,
+    the largest peak memory and the rows processed'''
+    trace = trace.fillna({'detail': ''})
+    summary = trace.groupby(['stage', 'detail'], sort=False).agg(
+        calls=('wall_s', 'size'), wall_s=('wall_s', 'sum'), cpu_s=('cpu_s', 'sum'),
+        peak_mb=('peak_mb', 'max'), rows_in=('rows_in', 'sum'))
+    
+    return summary
+
+def compare_traces(before, after):
+    '''This function diffs two traces (dataframes or paths) stage by stage and returns the totals of
+    both with the change in wall time, slowest regressions first'''
+    before = read_trace(before) if isinstance(before, str) else before
+    after = read_trace(after) if isinstance(after, str) else after
+    diff = summarize_trace(before).join(summarize_trace(after), how='outer', lsuffix='_before', rsuffix='_after')
+    diff['wall_change_s'] = diff['wall_s_after'] - diff['wall_s_before']
+    diff['wall_ratio'] = diff['wall_s_after'] / diff['wall_s_before']
+    
+    return diff.sort_values('wall_change_s', ascending=False)
+
+#Profile the whole process when the environment variable names a trace file
+if os.environ.get(ENV_VAR):
+    start()
+    atexit.register(lambda path=os.environ[ENV_VAR]: write_trace(stop(), path))
@@ -0,0 +1,136 @@
+import sys
+import hashlib
+import weakref
+import functools
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+
+
+##------------------------Content Keys--------------------------##
+
+def content_hash(obj, digest=None):
+    '''This function hashes an argument by its contents rather than its identity: dataframes, series
+    and indexes by their values, index, names and dtypes, arrays by their bytes, and containers by their
+    items. Returns the hex digest'''
+    top = digest is None
+    digest = hashlib.sha1() if top else digest
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        digest.update(type(obj).__name__.encode())
+        digest.update(repr(getattr(obj, 'columns', getattr(obj, 'name', None))).encode())
+        digest.update(repr(getattr(obj, 'dtypes', obj.dtype)).encode())
+        digest.update(pd.util.hash_pandas_object(obj, index=not isinstance(obj, pd.Index)).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        digest.update(repr((obj.shape, obj.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        digest.update(b'dict')
+        for key in sorted(obj, key=repr):
+            content_hash(key, digest)
+            content_hash(obj[key], digest)
+    elif isinstance(obj, (list, tuple)):
+        digest.update(type(obj).__name__.encode())
+        for item in obj:
+            content_hash(item, digest)
+    else:
+        digest.update(repr(obj).encode())
+    
+    return digest.hexdigest() if top else None
+
+def size_of(obj):
+    '''This function estimates the memory held by a cached value in bytes'''
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(np.sum(obj.memory_usage(deep=True)))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(size_of(item) for item in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(size_of(value) for value in obj.values())
+    
+    return sys.getsizeof(obj)
+
+##------------------------Cache--------------------------##
+
+class LRUCache:
+    '''Least-recently-used cache bounded by both entry count and estimated bytes. When either
+    bound is exceeded the least recently used entries are evicted'''
+
+    def __init__(self, max_items=128, max_bytes=512 * 2 ** 20):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        '''This function returns a cached value and marks it most recently used'''
+        if key not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        
+        return self.entries[key][0]
+
+    def put(self, key, value):
+        '''This function caches a value, evicting old entries to stay within the bounds. A value
+        larger than max_bytes on its own is not cached'''
+        size = size_of(value)
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while (len(self.entries) > self.max_items) or (self.bytes > self.max_bytes):
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        '''This function empties the cache'''
+        self.entries.clear()
+        self.bytes = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+def memoize(cache=None, max_items=128, max_bytes=512 * 2 ** 20):
+    '''This decorator caches a function's results by the content of its arguments (see content_hash),
+    so calling it again with equal data skips the work even if the objects are new. Results are kept
+    in an LRUCache, shared if one is passed in; the decorated function has .cache for inspection'''
+    cache = LRUCache(max_items, max_bytes) if cache is None else cache
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, content_hash((args, kwargs)))
+            result = cache.get(key, cache)
+            if result is cache:
+                result = func(*args, **kwargs)
+                cache.put(key, result)
+            return result
+        wrapper.cache = cache
+        return wrapper
+    
+    return decorator
+
+##------------------------Per-Frame Caches--------------------------##
+
+#Values derived from a dataframe (indexes, cubes), keyed by id of the dataframe and a key naming the value
+_frame_values = {}
+
+def per_frame_cache(df, key, build):
+    '''This function returns the value cached for df under key, calling build() to make it the first
+    time. Values are kept by the identity of df rather than its contents, so lookups are free but a
+    value describes df as it was when built; build a new one if df is modified in place'''
+    cache_key = (id(df), key)
+    if cache_key not in _frame_values:
+        _frame_values[cache_key] = build()
+        #Drop the value when df is garbage collected, so its id can't be reused for another frame
+        weakref.finalize(df, _frame_values.pop, cache_key, None)
+    
+    return _frame_values[cache_key]
@@ -1,21 +1,23 @@
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
-from sklearn.metrics import mean_squared_error
-from statsmodels.tsa.api import Holt, ExponentialSmoothing
 from math import sqrt 
 import explore as e
 import wrangle as w
+import cube as c
+import baselines as b
+import sweep as s
+import memo
+import instrument
 
 
 ##-------------------------Train-Test Split-------------------------##
 
+@instrument.stage()
 def post_pandemic_split(df):
     '''This function provides a new train test split based on the selection of test
     as crime reported post covid lockdown (March 2021 onwards)'''
-    #Group data by day, sum the count of crime, create a new df
-    new_df = df.groupby(['date']).sum()
-    new_df = new_df[['count_of_crime']]
+    #Daily count of crime from the cached cube
+    new_df = c.daily_counts(df)
     ## Performing new train-test split
     train = new_df.loc['2017-03-14':'2019-03-15']
     validate = new_df.loc['2019-03-16':'2020-03-16']
@@ -25,115 +27,104 @@ def post_pandemic_split(df):
 
 ##------------------------Model Evaluation--------------------------##
 
-def evaluate_holt(target_var):
-    '''evaluate function to compute rmse for holt models'''
-    #get clean data
+#Session cache for loaded data and model fits, bounded by entries and memory
+session_cache = memo.LRUCache(max_items=256, max_bytes=1024 * 2 ** 20)
+
+#Holt models evaluated by evaluate_holt_models, as sweep configurations
+HOLT_MODELS = {
+    'Holts': {'model': 'holt', 'damped_trend': True},
+    'Holts seasonal add': {'model': 'holt_winters', 'trend': 'add', 'seasonal': 'add',
+                           'seasonal_periods': 365, 'use_boxcox': True},
+}
+
+@memo.memoize(session_cache)
+def load_split(fingerprint):
+    '''This function loads the clean data, creates the fraud df and splits it. It is memoized on the
+    source data fingerprint, so it runs once per session unless the source files change'''
     df = w.get_clean_data()
-    #Create fraud df
     fraud_df = w.create_fraud_df(df)
-    #Get train, validate, test
-    train, validate, test = e.train_validate_test_split(fraud_df)
+    
+    return e.train_validate_test_split(fraud_df)
+
+def get_split():
+    '''This function returns train, validate and test for the current source data, loading them
+    only the first time (or after the source files change)'''
+    return load_split(w.source_fingerprint())
+
+@memo.memoize(session_cache)
+def fit_forecast(config, y, horizon):
+    '''This function fits a model configuration to the values y and returns its fitted values and
+    forecast. It is memoized on the content of y and the configuration, so refitting an unchanged
+    model is free'''
+    return s.fit_forecast(config, y, horizon)
+
+def holt_predictions(train, validate, config, target_var='count_of_crime'):
+    '''This function fits a Holt model on train and returns its predictions for validate, one
+    forecast step per validate row, rounded to two places'''
+    y = train[target_var].to_numpy(dtype=float)
+    forecast = fit_forecast(config, y, len(validate))[1]
+    
+    return pd.DataFrame({target_var: np.round(forecast, 2)}, index=validate.index)
+
+def evaluate_holt(validate, yhat_df, target_var='count_of_crime'):
+    '''evaluate function to compute rmse for holt models'''
+    from sklearn.metrics import mean_squared_error
     rmse = round(sqrt(mean_squared_error(validate[target_var], yhat_df[target_var])), 0)
     return rmse
 
-def plot_and_eval(target_var):
+def plot_and_eval(train, validate, yhat_df, target_var='count_of_crime'):
     '''plots and evaluates RMSE for holt models'''
+    import matplotlib.pyplot as plt
     plt.figure(figsize = (12,4))
     plt.plot(train[target_var], label = 'Train', linewidth = 1)
     plt.plot(validate[target_var], label = 'Validate', linewidth = 1)
     plt.plot(yhat_df[target_var])
     plt.title(target_var)
-    rmse = evaluate_holt(target_var)
+    rmse = evaluate_holt(validate, yhat_df, target_var)
     print(target_var, '-- RMSE: {:.0f}'.format(rmse))
     plt.show()
     
-def append_eval_df(model_type, target_var):
+def append_eval_df(eval_df, model_type, validate, yhat_df, target_var='count_of_crime'):
     '''appends eval df for holt models'''
-    rmse = evaluate_holt(target_var)
+    rmse = evaluate_holt(validate, yhat_df, target_var)
     d = {'model_type': [model_type], 'target_var': [target_var], 'rmse': [rmse]}
     d = pd.DataFrame(d)
-    return eval_df.append(d, ignore_index = True)
+    return pd.concat([eval_df, d], ignore_index = True) if len(eval_df) else d
 
-def evaluate_holt_models(train,validate,test):
+@instrument.stage()
+def evaluate_holt_models(train=None,validate=None,test=None):
+    '''This function fits each of HOLT_MODELS on train and returns their RMSE on validate. Without
+    train/validate it uses get_split(); fits are memoized, so re-running skips unchanged models'''
+    if train is None:
+        train, validate, test = get_split()
     #Create eval df to place results
     eval_df = pd.DataFrame(columns=['model_type', 'target_var', 'rmse'])
-    #Building place for predictions
-    crime = train['count_of_crime'][-1:][0]
-    yhat_df = pd.DataFrame({'count_of_crime': [crime]}, index = validate.index)
-    
-    #Holts Linear
-    # Create the model object
-    model_holt = Holt(train['count_of_crime'], exponential=False, damped_trend=True).fit(optimized=True)
-    # make predictions for each date in validate 
-    predictions_holt = model_holt.forecast(len(validate))
-    #Set index to return date time
-    predictions_holt.index=yhat_df.index
-    # add predictions to yhat_df
-    yhat_df['count_of_crime'] = round(predictions_holt, 2)
-    #Place results in evaluate dataframe
-    eval_df = append_eval_df(model_type = 'Holts', 
-                             target_var = 'count_of_crime')
-    
-    #holts seasonal
-    #fit
-    fit1 = ExponentialSmoothing(train.count_of_crime, seasonal_periods=365, trend='add',
-                            seasonal='add', use_boxcox=True).fit()
-    #forecast
-    predictions_holt_seasonal = fit1.forecast(validate.shape[0]).rename('count_of_crime').to_frame()
-    #Set index
-    predictions_holt_seasonal.index = yhat_df.index
-    # add predictions to yhat_df
-    yhat_df['count_of_crime'] = round(predictions_holt, 2)
-    eval_df = append_eval_df(model_type = 'Holts seaonal add', 
-                             target_var = 'count_of_crime')
+    for model_type, config in HOLT_MODELS.items():
+        # make predictions for each date in validate
+        yhat_df = holt_predictions(train, validate, config)
+        #Place results in evaluate dataframe
+        eval_df = append_eval_df(eval_df, model_type, validate, yhat_df)
     
     return eval_df
 
+@instrument.stage()
 def eval_timeseries_models(train,validate,test):
     '''This function evaluates time series models, taking in train, validate
     and test, and producing a dataframe with their performances on train and validate data'''
-    #Making predictions dataframes
-    predictions_train = pd.DataFrame(index=train.index)
-    predictions_validate = pd.DataFrame(index=validate.index)
-    #Creating scores dataframe
-    scores = pd.DataFrame(columns=['model_name', 'train_score', 'validate_score'])
-    
-    #Simple average
-    avg_crime = round(train['count_of_crime'].mean(), 2)
-    predictions_train['simple_average'] = avg_crime
-    predictions_validate['simple_average'] = avg_crime
-    RMSE_train = round(np.sqrt(mean_squared_error(train['count_of_crime'], predictions_train['simple_average'])))
-    RMSE_validate = round(np.sqrt(mean_squared_error(validate['count_of_crime'], predictions_validate['simple_average'])))
-    model_name='simple_average'
-    scores.loc[len(scores)] = [model_name, RMSE_train, RMSE_validate]
-    
-    #Moving averages
-    target = 'count_of_crime'
-    period = 30
-    ma = '30 d moving_average'
-    rolling_count = round(train.count_of_crime.rolling(period).mean()[-1], 2)
-    predictions_train[ma] = rolling_count
-    predictions_validate[ma] = rolling_count
-    RMSE_train = round(np.sqrt(mean_squared_error(train['count_of_crime'], predictions_train['30 d moving_average'])))
-    RMSE_validate = round(np.sqrt(mean_squared_error(validate['count_of_crime'], predictions_validate['30 d moving_average'])))
-    model_name='30 d moving_average'
-    scores.loc[len(scores)] = [model_name, RMSE_train, RMSE_validate]
-    
-    period = 90
-    ma = '90 d moving_average'
-    rolling_count_90 = round(train.count_of_crime.rolling(period).mean()[-1], 2)
-    predictions_train[ma] = rolling_count_90
-    predictions_validate[ma] = rolling_count_90
-    RMSE_train = round(np.sqrt(mean_squared_error(train['count_of_crime'], predictions_train['90 d moving_average'])))
-    RMSE_validate = round(np.sqrt(mean_squared_error(validate['count_of_crime'], predictions_validate['90 d moving_average'])))
-    model_name='90 d moving_average'
-    scores.loc[len(scores)] = [model_name, RMSE_train, RMSE_validate]
+    y = train['count_of_crime']
+    #Simple average and 30/90 day moving averages in one pass, rounded like the reported forecasts
+    levels = np.concatenate([[y.mean()], b.moving_average_levels(y, [30, 90])]).round(2)
+    #Creating scores dataframe, RMSE of every model at once
+    scores = pd.DataFrame({'model_name': ['simple_average', '30 d moving_average', '90 d moving_average'],
+                           'train_score': b.rmse_constant(y, levels).round().astype(int),
+                           'validate_score': b.rmse_constant(validate['count_of_crime'], levels).round().astype(int)})
     
     return scores
 
 def eval_simple_test(train,validate,test):
     '''This function evaluates simple average model, taking in train, validate
     and test, and producing a dataframe with their performances on train,validate and test'''
+    from sklearn.metrics import mean_squared_error
     #Making predictions dataframes
     predictions_train = pd.DataFrame(index=train.index)
     predictions_validate = pd.DataFrame(index=validate.index)
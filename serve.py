@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import wrangle as w
+import cube as c
+import hierarchy as h
+import instrument
+
+
+##------------------------Snapshots----------------------##
+
+#File the nightly refresh writes the serving snapshot to
+SNAPSHOT_PATH = 'forecast_snapshot.npz'
+#Label of the citywide series, the sum of every district
+ALL_DISTRICTS = 'all'
+
+@instrument.stage()
+def build_snapshot(df=None, path=SNAPSHOT_PATH, categories=tuple(w.OFFENSE_CATEGORIES), horizon=90,
+                   config=None, fit_days=365):
+    '''This function precomputes everything the forecast server answers from and writes it to path:
+    the daily counts of every category (plus "all") per district and citywide, and a forecast of the
+    next horizon days for each, fit on the last fit_days days with one configuration (sweep.model_grid
+    style, the simple average by default). District forecasts are summed for the citywide forecast, so
+    they agree. The file is written next to path and renamed over it, so a server never sees a partial
+    snapshot. df is the clean crime dataframe, get_clean_data() by default'''
+    df = w.get_clean_data() if df is None else df
+    cube = c.build_daily_cube(df, list(categories))
+    #(category, date, district), with the citywide sum as the last district
+    counts = cube.counts.sum(axis=(3, 4))
+    counts = np.concatenate([counts, counts.sum(axis=2, keepdims=True)], axis=2).astype(np.int32)
+    n_districts = len(cube.districts)
+    forecasts = np.empty((len(cube.categories), horizon, n_districts + 1))
+    for i in range(len(cube.categories)):
+        forecasts[i, :, :n_districts] = h.forecast_matrix(counts[i, -fit_days:, :n_districts], horizon, config)
+    forecasts[:, :, n_districts] = forecasts[:, :, :n_districts].sum(axis=2)
+    meta = {'created': datetime.now().isoformat(timespec='seconds'), 'first_date': str(cube.dates[0].date()),
+            'categories': [str(label) for label in cube.categories],
+            'districts': [str(label) for label in cube.districts] + [ALL_DISTRICTS],
+            'config': config or {'model': 'simple_average'}, 'fit_days': fit_days}
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez(f, counts=counts, forecasts=forecasts.round(2), meta=np.array(json.dumps(meta)))
+    os.replace(temp_path, path)
+    
+    return path
+
+class Snapshot:
+    '''Precomputed daily counts and forecasts loaded from a snapshot file, indexed by category and
+    district. Queries are array slices, so each one takes microseconds'''
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        with np.load(path) as data:
+            self.counts = data['counts']
+            self.forecasts = data['forecasts']
+            self.meta = json.loads(str(data['meta']))
+        self.path = path
+        self.categories = {label: i for i, label in enumerate(self.meta['categories'])}
+        self.districts = {label: j for j, label in enumerate(self.meta['districts'])}
+        self.first_day = np.datetime64(self.meta['first_date'], 'D')
+        days = self.first_day + np.arange(self.counts.shape[1] + self.forecasts.shape[1])
+        #Date labels of the history followed by the forecast days, made once for every response
+        self.date_labels = np.datetime_as_string(days).tolist()
+
+    def locate(self, category, district):
+        '''This function returns the array positions of a category and district, raising KeyError
+        for unknown ones'''
+        if category not in self.categories:
+            raise KeyError(f'unknown category {category!r}')
+        if district not in self.districts:
+            raise KeyError(f'unknown district {district!r}')
+        
+        return self.categories[category], self.districts[district]
+
+    def day(self, date, default):
+        '''This function returns the history position of a YYYY-MM-DD date, or default for None'''
+        if date is None:
+            return default
+        
+        return int((np.datetime64(date, 'D') - self.first_day).astype(int))
+
+    def history(self, category='all', district=ALL_DISTRICTS, start=None, end=None):
+        '''This function returns the daily counts of a category and district from start to end
+        (inclusive, the whole history by default)'''
+        i, j = self.locate(category, district)
+        n_days = self.counts.shape[1]
+        first = min(max(self.day(start, 0), 0), n_days)
+        last = min(max(self.day(end, n_days - 1) + 1, first), n_days)
+        
+        return {'category': category, 'district': district, 'dates': self.date_labels[first:last],
+                'counts': self.counts[i, first:last, j].tolist()}
+
+    def forecast(self, category='all', district=ALL_DISTRICTS, days=30):
+        '''This function returns the forecast daily counts of a category and district for the next
+        days days after the history'''
+        i, j = self.locate(category, district)
+        if not 0 < days <= self.forecasts.shape[1]:
+            raise ValueError(f'days must be between 1 and {self.forecasts.shape[1]}')
+        first = self.counts.shape[1]
+        
+        return {'category': category, 'district': district, 'dates': self.date_labels[first:first + days],
+                'forecast': self.forecasts[i, :days, j].tolist()}
+
+    def info(self):
+        '''This function describes the snapshot being served'''
+        return dict(self.meta, days=self.counts.shape[1], horizon=self.forecasts.shape[1])
+
+##------------------------Server----------------------##
+
+class ForecastHandler(BaseHTTPRequestHandler):
+    '''Answers GET /forecast?category=&district=&days=, GET /history?category=&district=&start=&end=
+    and GET /health with JSON, and POST /reload to load the snapshot file again'''
+    protocol_version = 'HTTP/1.1'
+    #Buffer each response into one write and send it at once, instead of waiting on delayed acks
+    wbufsize = 1 << 16
+    disable_nagle_algorithm = True
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        #One reference for the whole request, so a hot swap can't change the snapshot mid-answer
+        snapshot = self.server.snapshot
+        category = params.get('category', 'all')
+        district = params.get('district', ALL_DISTRICTS)
+        try:
+            if url.path == '/forecast':
+                body = snapshot.forecast(category, district, int(params.get('days', 30)))
+            elif url.path == '/history':
+                body = snapshot.history(category, district, params.get('start'), params.get('end'))
+            elif url.path == '/health':
+                body = snapshot.info()
+            else:
+                return self.send_json(404, {'error': f'no route {url.path}'})
+        except KeyError as error:
+            return self.send_json(404, {'error': error.args[0]})
+        except ValueError as error:
+            return self.send_json(400, {'error': str(error)})
+        self.send_json(200, body)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/reload':
+            return self.send_json(404, {'error': f'no route {self.path}'})
+        self.server.reload()
+        self.send_json(200, self.server.snapshot.info())
+
+    def log_message(self, format, *args):
+        #Per-request logging would dominate the latency
+        pass
+
+class ForecastServer(ThreadingHTTPServer):
+    '''Threaded HTTP server over the current Snapshot. reload() loads the snapshot file into a new
+    Snapshot and then swaps the reference, so requests in flight finish on the old one and no request
+    ever sees a half-loaded snapshot. With watch_interval a background thread reloads whenever the
+    snapshot file is replaced'''
+    daemon_threads = True
+
+    def __init__(self, path=SNAPSHOT_PATH, host='127.0.0.1', port=8000, watch_interval=1.0):
+        super().__init__((host, port), ForecastHandler)
+        self.path = path
+        self.lock = threading.Lock()
+        self.snapshot = Snapshot(path)
+        self.loaded_mtime = os.stat(path).st_mtime_ns
+        self.reloads = 0
+        if watch_interval:
+            threading.Thread(target=self.watch, args=(watch_interval,), daemon=True).start()
+
+    def reload(self):
+        '''This function loads the snapshot file and atomically swaps it in'''
+        with self.lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            snapshot = Snapshot(self.path)
+            self.snapshot, self.loaded_mtime = snapshot, mtime
+            self.reloads += 1
+
+    def watch(self, interval):
+        '''This function polls the snapshot file and reloads it when the nightly refresh replaces it'''
+        while True:
+            time.sleep(interval)
+            try:
+                if os.stat(self.path).st_mtime_ns != self.loaded_mtime:
+                    self.reload()
+            except (OSError, ValueError):
+                #Keep serving the current snapshot if the new one can't be read
+                continue
+
+def start_server(path=SNAPSHOT_PATH, host='127.0.0.1', port=8000, watch_interval=1.0):
+    '''This function starts a ForecastServer on a background thread and returns it; port 0 picks a
+    free port (see server.server_address). Stop it with server.shutdown()'''
+    server = ForecastServer(path, host, port, watch_interval)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    
+    return server
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:2] == ['build']:
+        #python serve.py build: the nightly refresh
+        print(build_snapshot())
+    else:
+        #python serve.py [port]
+        server = ForecastServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
+        print('serving on http://%s:%d' % server.server_address)
+        server.serve_forever()
@@ -0,0 +1,130 @@
+import pandas as pd
+import numpy as np
+import wrangle as w
+import memo
+
+
+##------------------------Spatial Grid--------------------------##
+
+#Latitude/longitude box around Boston; coordinates outside it (including the 0 and -1
+#placeholders in the raw data) are treated as missing
+BOSTON_BOUNDS = (42.20, 42.42, -71.20, -70.95)
+#Mean earth radius in meters, for radius queries
+EARTH_RADIUS = 6_371_000
+
+def haversine(lat1, long1, lat2, long2):
+    '''This function returns the great-circle distance in meters between coordinates, vectorized'''
+    lat1, long1, lat2, long2 = map(np.radians, (lat1, long1, lat2, long2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((long2 - long1) / 2) ** 2
+    
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+class SpatialIndex:
+    '''Uniform lat/long grid over the valid coordinates of a crime dataframe. Every row with a valid
+    location is binned to a cell once; bounding-box and radius queries then only look at the rows of
+    the cells they overlap, and counts per cell come from a bincount over cell ids'''
+
+    def __init__(self, df, cell_size=0.005, bounds=BOSTON_BOUNDS):
+        self.cell_size = cell_size
+        self.lat_min, self.lat_max, self.long_min, self.long_max = bounds
+        self.n_rows = int(np.ceil((self.lat_max - self.lat_min) / cell_size))
+        self.n_cols = int(np.ceil((self.long_max - self.long_min) / cell_size))
+        self.lat = df['lat'].to_numpy(dtype=float)
+        self.long = df['long'].to_numpy(dtype=float)
+        self.valid = ((self.lat >= self.lat_min) & (self.lat < self.lat_max)
+                      & (self.long >= self.long_min) & (self.long < self.long_max))
+        #Cell id of every row, -1 where the location is missing or outside the bounds
+        self.cells = np.full(len(df), -1, dtype=np.int64)
+        self.cells[self.valid] = self.cell_of(self.lat[self.valid], self.long[self.valid])
+        self._cell_rows = w.posting_lists(self.cells, self.n_rows * self.n_cols)
+
+    def cell_of(self, lat, long):
+        '''This function returns the grid cell ids of coordinates inside the bounds'''
+        row = np.clip(((np.asarray(lat) - self.lat_min) // self.cell_size).astype(np.int64), 0, self.n_rows - 1)
+        col = np.clip(((np.asarray(long) - self.long_min) // self.cell_size).astype(np.int64), 0, self.n_cols - 1)
+        
+        return row * self.n_cols + col
+
+    def cell_centers(self, cells):
+        '''This function returns the (lat, long) centers of grid cell ids'''
+        row, col = np.divmod(np.asarray(cells), self.n_cols)
+        
+        return (self.lat_min + (row + 0.5) * self.cell_size, self.long_min + (col + 0.5) * self.cell_size)
+
+    def rows_in_cells(self, cells):
+        '''This function returns the sorted row positions of every row in the given cells'''
+        rows, offsets = self._cell_rows
+        chunks = [rows[offsets[cell]:offsets[cell + 1]] for cell in cells]
+        if not chunks:
+            return np.array([], dtype=np.intp)
+        
+        return np.sort(np.concatenate(chunks))
+
+    def cells_in_bbox(self, lat_min, lat_max, long_min, long_max):
+        '''This function returns the ids of every cell overlapping a bounding box'''
+        first_row, first_col = divmod(int(self.cell_of(max(lat_min, self.lat_min), max(long_min, self.long_min))), self.n_cols)
+        last_row, last_col = divmod(int(self.cell_of(min(lat_max, self.lat_max), min(long_max, self.long_max))), self.n_cols)
+        rows, cols = np.meshgrid(np.arange(first_row, last_row + 1), np.arange(first_col, last_col + 1), indexing='ij')
+        
+        return (rows * self.n_cols + cols).ravel()
+
+    def bbox(self, lat_min, lat_max, long_min, long_max):
+        '''This function returns the sorted row positions of crimes inside a bounding box'''
+        rows = self.rows_in_cells(self.cells_in_bbox(lat_min, lat_max, long_min, long_max))
+        lat, long = self.lat[rows], self.long[rows]
+        
+        return rows[(lat >= lat_min) & (lat <= lat_max) & (long >= long_min) & (long <= long_max)]
+
+    def radius(self, lat, long, meters):
+        '''This function returns the sorted row positions of crimes within meters of a point,
+        checking exact distances only for rows in the cells around it'''
+        dlat = np.degrees(meters / EARTH_RADIUS)
+        dlong = dlat / np.cos(np.radians(lat))
+        rows = self.rows_in_cells(self.cells_in_bbox(lat - dlat, lat + dlat, long - dlong, long + dlong))
+        
+        return rows[haversine(lat, long, self.lat[rows], self.long[rows]) <= meters]
+
+    def category_cells(self, category=None, index=None, df=None):
+        '''This function returns the row positions with a valid location, limited to one offense category
+        (which needs the indexed df, or its OffenseIndex)'''
+        if category is None:
+            return np.flatnonzero(self.valid)
+        if index is None:
+            index = w.get_offense_index(df)
+        rows = index.rows(category)
+        
+        return rows[self.valid[rows]]
+
+    def cell_counts(self, category=None, index=None, df=None):
+        '''This function returns the number of crimes in every non-empty cell, with the cell
+        centers, busiest cells first, as a hotspot table'''
+        rows = self.category_cells(category, index, df)
+        counts = np.bincount(self.cells[rows], minlength=self.n_rows * self.n_cols)
+        cells = np.flatnonzero(counts)
+        lat, long = self.cell_centers(cells)
+        hotspots = pd.DataFrame({'cell': cells, 'lat': lat, 'long': long, 'count_of_crime': counts[cells]})
+        
+        return hotspots.sort_values('count_of_crime', ascending=False).reset_index(drop=True)
+
+    def cell_daily_counts(self, dates, category=None, cells=None, index=None, df=None):
+        '''This function returns a gap-free date x cell dataframe of daily crime counts for the given
+        cells (every non-empty cell by default). dates are the occurred_on_date values of the indexed
+        dataframe'''
+        rows = self.category_cells(category, index, df)
+        days = np.asarray(dates)[rows].astype('datetime64[D]').astype(np.int64)
+        row_cells = self.cells[rows]
+        cells = np.unique(row_cells) if cells is None else np.asarray(cells)
+        column = pd.Index(cells).get_indexer(row_cells)
+        keep = column >= 0
+        days, column = days[keep], column[keep]
+        first = days.min() if len(days) else 0
+        n_days = (days.max() - first + 1) if len(days) else 0
+        counts = np.bincount((days - first) * len(cells) + column, minlength=n_days * len(cells))
+        index_dates = pd.DatetimeIndex(pd.to_datetime(first + np.arange(n_days), unit='D'), name='date')
+        
+        return pd.DataFrame(counts.reshape(n_days, len(cells)), index=index_dates, columns=pd.Index(cells, name='cell'))
+
+def get_spatial_index(df, cell_size=0.005):
+    '''This function returns the SpatialIndex of df, building it the first time df is seen.
+    Build a new SpatialIndex if df is modified in place'''
+    return memo.per_frame_cache(df, ('spatial_index', cell_size), lambda: SpatialIndex(df, cell_size))
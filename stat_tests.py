@@ -0,0 +1,196 @@
+import pandas as pd
+import numpy as np
+
+
+##------------------------Comparisons--------------------------##
+
+def period_masks(dates, kind, breakpoints=()):
+    '''This function builds the boolean (comparison x day) masks of one batch of comparisons.
+    kind "month" compares every calendar month with the rest of the days, "year" every year with
+    the rest, and "breakpoint" the days before each breakpoint with the days on or after it.
+    Returns (labels, group masks, comparison masks)'''
+    dates = pd.DatetimeIndex(dates)
+    if kind in ('month', 'year'):
+        values = dates.month if kind == 'month' else dates.year
+        labels = np.unique(values)
+        group = values.to_numpy()[None, :] == labels[:, None]
+        return [f'{kind} {label} vs rest' for label in labels], group, ~group
+    if kind == 'breakpoint':
+        points = pd.DatetimeIndex(breakpoints)
+        before = dates.to_numpy()[None, :] < points.to_numpy()[:, None]
+        return [f'before {point.date()} vs after' for point in points], before, ~before
+    raise ValueError(f'kind must be "month", "year" or "breakpoint", not {kind!r}')
+
+def build_comparisons(dates, kinds=('month', 'year'), breakpoints=()):
+    '''This function stacks the masks of several kinds of comparison into one batch'''
+    labels, groups, others = [], [], []
+    for kind in kinds:
+        kind_labels, group, other = period_masks(dates, kind, breakpoints)
+        labels += kind_labels
+        groups.append(group)
+        others.append(other)
+    if breakpoints and 'breakpoint' not in kinds:
+        kind_labels, group, other = period_masks(dates, 'breakpoint', breakpoints)
+        labels += kind_labels
+        groups.append(group)
+        others.append(other)
+    
+    return labels, np.vstack(groups), np.vstack(others)
+
+##------------------------Parametric Tests--------------------------##
+
+def group_moments(masks, Y):
+    '''This function returns the count, mean and sample variance of every series in Y (day x series)
+    over the days of every mask (comparison x day), as (comparison x series) arrays from two
+    matrix products'''
+    weights = masks.astype(float)
+    n = weights.sum(axis=1)[:, None]
+    mean = (weights @ Y) / n
+    var = ((weights @ (Y ** 2)) - n * mean ** 2) / (n - 1)
+    
+    return n, mean, np.maximum(var, 0)
+
+def welch_ttest(groups, others, Y):
+    '''This function runs Welch's unequal-variance t-test of every group against its comparison
+    days for every series at once. Returns (n_a, n_b, mean_a, mean_b, t, df, two-sided p)'''
+    from scipy import stats
+    n_a, mean_a, var_a = group_moments(groups, Y)
+    n_b, mean_b, var_b = group_moments(others, Y)
+    se_a, se_b = var_a / n_a, var_b / n_b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (mean_a - mean_b) / np.sqrt(se_a + se_b)
+        df = (se_a + se_b) ** 2 / (se_a ** 2 / (n_a - 1) + se_b ** 2 / (n_b - 1))
+    p = 2 * stats.t.sf(np.abs(t), df)
+    
+    return n_a, n_b, mean_a, mean_b, t, df, p
+
+def one_sample_ttest(groups, Y):
+    '''This function runs a one-sample t-test of every group's days against the mean of the whole
+    series (the period vs population test), for every series at once. Returns
+    (n_a, mean_a, population mean, t, df, two-sided p)'''
+    from scipy import stats
+    n_a, mean_a, var_a = group_moments(groups, Y)
+    population = Y.mean(axis=0)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (mean_a - population) / np.sqrt(var_a / n_a)
+    df = n_a - 1
+    p = 2 * stats.t.sf(np.abs(t), df)
+    
+    return n_a, mean_a, np.broadcast_to(population, mean_a.shape), t, df, p
+
+##------------------------Resampling Tests--------------------------##
+
+def resample_counts(n, size, rng):
+    '''This function draws size bootstrap resamples of n days and returns how many times each day
+    was drawn in each resample, as a (size x n) matrix'''
+    draws = rng.integers(0, n, (size, n)) + (np.arange(size) * n)[:, None]
+    
+    return np.bincount(draws.ravel(), minlength=size * n).reshape(size, n).astype(float)
+
+def bootstrap_ci(a, b, rng, n_boot=2000, ci=0.95, block=500):
+    '''This function returns the bootstrap confidence interval of mean(a) - mean(b) for every series
+    (columns of a and b). Each block of resamples is drawn as counts per day, so one matrix
+    product gives the resampled means of every series'''
+    diffs = []
+    for start in range(0, n_boot, block):
+        size = min(block, n_boot - start)
+        mean_a = resample_counts(len(a), size, rng) @ a / len(a)
+        mean_b = resample_counts(len(b), size, rng) @ b / len(b)
+        diffs.append(mean_a - mean_b)
+    diffs = np.vstack(diffs)
+    tail = (1 - ci) / 2 * 100
+    
+    return np.percentile(diffs, tail, axis=0), np.percentile(diffs, 100 - tail, axis=0)
+
+def permutation_p(a, b, rng, n_perm=2000, block=500):
+    '''This function returns the two-sided permutation p-value of mean(a) - mean(b) for every series.
+    Each permutation relabels which pooled days belong to a; a block of permutations is one 0/1
+    matrix, so one matrix product gives every permuted group sum'''
+    pooled = np.vstack([a, b])
+    total = pooled.sum(axis=0)
+    n_a, n_b = len(a), len(b)
+    observed = np.abs(a.mean(axis=0) - b.mean(axis=0))
+    labels = np.zeros(len(pooled))
+    labels[:n_a] = 1
+    extreme = np.zeros(pooled.shape[1])
+    for start in range(0, n_perm, block):
+        size = min(block, n_perm - start)
+        members = rng.permuted(np.tile(labels, (size, 1)), axis=1)
+        sum_a = members @ pooled
+        diff = np.abs(sum_a / n_a - (total - sum_a) / n_b)
+        extreme += (diff >= observed - 1e-12).sum(axis=0)
+    
+    return (extreme + 1) / (n_perm + 1)
+
+##------------------------Screening--------------------------##
+
+def as_matrix(daily, target_var='count_of_crime'):
+    '''This function returns (dates, day x series array, series names) from a daily count series,
+    a daily dataframe with the target column, or a date x series dataframe'''
+    if isinstance(daily, pd.Series):
+        daily = daily.to_frame(daily.name or target_var)
+    if target_var in daily.columns and daily.shape[1] == 1:
+        return daily.index, daily[[target_var]].to_numpy(dtype=float), [target_var]
+    
+    return daily.index, daily.to_numpy(dtype=float), list(daily.columns)
+
+def category_matrix(daily_cube, categories=None, **kwargs):
+    '''This function returns a gap-free date x category dataframe of daily counts from a
+    cube.DailyCube, for screening every category at once'''
+    categories = list(daily_cube.categories) if categories is None else categories
+    
+    return pd.DataFrame({category: daily_cube.daily(category, **kwargs) for category in categories},
+                        index=daily_cube.dates)
+
+def compare_periods(daily, kinds=('month', 'year'), breakpoints=(), test='welch', n_boot=0, n_perm=0,
+                    seed=0, alpha=0.05, target_var='count_of_crime'):
+    '''This function runs a whole batch of period comparisons over daily counts in one go and returns
+    a results table with one row per comparison and series. daily is a daily count dataframe (as
+    from train_validate_test_split) or a date x series dataframe such as category_matrix. kinds and
+    breakpoints choose the comparisons (see period_masks); test is "welch" (period vs the rest) or
+    "one_sample" (period vs the mean of the whole series). n_boot adds a bootstrap confidence interval
+    of the difference in means and n_perm a permutation p-value, both from a seeded RNG'''
+    dates, Y, names = as_matrix(daily, target_var)
+    labels, groups, others = build_comparisons(dates, kinds, breakpoints)
+    if test == 'welch':
+        n_a, n_b, mean_a, mean_b, t, df, p = welch_ttest(groups, others, Y)
+    elif test == 'one_sample':
+        n_a, mean_a, mean_b, t, df, p = one_sample_ttest(groups, Y)
+        n_b = np.full(n_a.shape, len(Y))
+    else:
+        raise ValueError(f'test must be "welch" or "one_sample", not {test!r}')
+    shape = t.shape
+    results = pd.DataFrame({
+        'comparison': np.repeat(labels, shape[1]),
+        'series': np.tile(names, shape[0]),
+        'n_a': np.broadcast_to(n_a, shape).ravel().astype(int),
+        'n_b': np.broadcast_to(n_b, shape).ravel().astype(int),
+        'mean_a': mean_a.ravel(),
+        'mean_b': mean_b.ravel(),
+        'diff': (mean_a - mean_b).ravel(),
+        't_stat': t.ravel(),
+        'df': np.broadcast_to(df, shape).ravel(),
+        'p_value': p.ravel(),
+    })
+    results['reject'] = results['p_value'] < alpha
+    if n_boot or n_perm:
+        rng = np.random.default_rng(seed)
+        ci_low, ci_high, perm_p = [], [], []
+        for group, other in zip(groups, others):
+            a = Y[group]
+            if n_boot:
+                #The population comparison resamples against every day
+                low, high = bootstrap_ci(a, Y[other] if test == 'welch' else Y, rng, n_boot)
+                ci_low.append(low)
+                ci_high.append(high)
+            if n_perm:
+                #mean(a) - mean(all) is a fixed multiple of mean(a) - mean(rest), so permuting a
+                #against the rest gives the population comparison's p-value too
+                perm_p.append(permutation_p(a, Y[other], rng, n_perm))
+        if n_boot:
+            results['ci_low'] = np.concatenate(ci_low)
+            results['ci_high'] = np.concatenate(ci_high)
+        if n_perm:
+            results['perm_p_value'] = np.concatenate(perm_p)
+    
+    return results
@@ -0,0 +1,235 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import wrangle as w
+import cube as c
+import instrument
+
+
+##------------------------Incident Store----------------------##
+
+#Directory the compact incident store is written to
+STORE_DIR = 'boston_crime_store'
+#Schema file of the store: current build, column order, storage kind, row count and source fingerprint
+SCHEMA = 'schema.json'
+#Suffix of the vocabulary file of an encoded column: the UTF-8 value of each code, fixed width
+VOCABULARY = '.vocabulary.npy'
+#Prefix of the build directories; each write goes into a new one and the schema switches to it
+BUILD_PREFIX = 'build-'
+#Layout version of the store; a store written with another layout reads as missing and is rebuilt
+STORE_FORMAT = 2
+
+#Columns derived from others on read instead of stored
+DERIVED_COLUMNS = ['location']
+
+def code_dtype(n):
+    '''This function returns the narrowest signed integer type holding codes 0..n-1 and -1 for missing'''
+    for dtype in (np.int8, np.int16, np.int32):
+        if n <= np.iinfo(dtype).max:
+            return dtype
+    
+    return np.int64
+
+def encode_column(s):
+    '''This function dictionary-encodes a string or categorical column, returning (codes, vocabulary)
+    with missing values as code -1'''
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, vocabulary = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, vocabulary = pd.factorize(s, sort=True)
+    
+    vocabulary = np.array([str(value).encode() for value in vocabulary], dtype=bytes)
+    
+    return codes.astype(code_dtype(len(vocabulary))), vocabulary
+
+@instrument.stage()
+def write_store(df, store_dir=STORE_DIR, fingerprint=None):
+    '''This function writes a clean crime dataframe as a compact incident store: string and categorical
+    columns as integer codes plus a fixed-width vocabulary array, dates and numeric columns as
+    fixed-width arrays, one .npy file per array. location isn't stored; it is rebuilt, approximately, from
+    lat/long (see IncidentStore.column). Every write goes into a new build directory and the schema
+    is switched to it last, so files other processes have mapped are never truncated or changed,
+    and an interrupted write leaves the previous build in place. Builds older than the one replaced
+    are removed'''
+    os.makedirs(store_dir, exist_ok=True)
+    previous = read_schema(store_dir)
+    build_dir = tempfile.mkdtemp(prefix=BUILD_PREFIX, dir=store_dir)
+    os.chmod(build_dir, 0o755)
+    columns = {}
+    for col in df.columns:
+        if col in DERIVED_COLUMNS:
+            continue
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype) or (s.dtype == object):
+            values, vocabulary = encode_column(s)
+            np.save(os.path.join(build_dir, f'{col}{VOCABULARY}'), vocabulary)
+            kind = 'dictionary'
+        elif pd.api.types.is_integer_dtype(s.dtype):
+            values, kind = pd.to_numeric(s, downcast='integer').to_numpy(), 'numeric'
+        else:
+            values, kind = s.to_numpy(), 'datetime' if pd.api.types.is_datetime64_dtype(s.dtype) else 'numeric'
+        np.save(os.path.join(build_dir, f'{col}.npy'), values)
+        columns[col] = {'kind': kind, 'dtype': values.dtype.str}
+    schema = {'format': STORE_FORMAT, 'build': os.path.basename(build_dir), 'rows': len(df),
+              'columns': columns, 'derived': [col for col in DERIVED_COLUMNS if col in df],
+              'fingerprint': fingerprint}
+    temp_path = os.path.join(build_dir, SCHEMA)
+    with open(temp_path, 'w') as f:
+        json.dump(schema, f)
+    os.replace(temp_path, os.path.join(store_dir, SCHEMA))
+    keep = {schema['build'], previous and previous['build']}
+    for name in os.listdir(store_dir):
+        if name.startswith(BUILD_PREFIX) and name not in keep:
+            #Processes still mapping these files keep them until they close them
+            shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+def read_schema(store_dir=STORE_DIR):
+    '''This function returns the schema of the store in store_dir, or None if there isn't a complete one'''
+    path = os.path.join(store_dir, SCHEMA)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        schema = json.load(f)
+    
+    return schema if schema.get('format') == STORE_FORMAT else None
+
+class IncidentStore:
+    '''Read-only view of an incident store written by write_store. Every column and vocabulary is a
+    memory-mapped array mapped on first use, so opening the store reads only the schema, and
+    processes opening the same store share one copy of its pages through the page cache instead of
+    each holding a dataframe.
+    A store stays on the build that was current when it was opened; a later write_store switches
+    new readers to a new build without touching this one, until the build after that removes it'''
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.schema = read_schema(store_dir)
+        if self.schema is None:
+            raise FileNotFoundError(f'No incident store in {store_dir!r}, run build_store() first')
+        self.build_dir = os.path.join(store_dir, self.schema['build'])
+        self._arrays = {}
+
+    def __len__(self):
+        return self.schema['rows']
+
+    @property
+    def columns(self):
+        '''Names of the columns of the store, including the derived ones'''
+        return list(self.schema['columns']) + self.schema['derived']
+
+    @property
+    def nbytes(self):
+        '''Size of the stored arrays in bytes'''
+        return sum(self.array(col).nbytes for col in self.schema['columns'])
+
+    def array(self, col):
+        '''This function returns the memory-mapped array of a stored column (codes for
+        dictionary-encoded columns)'''
+        if col not in self._arrays:
+            self._arrays[col] = np.load(os.path.join(self.build_dir, f'{col}.npy'), mmap_mode='r')
+        
+        return self._arrays[col]
+
+    def vocabulary(self, col):
+        '''This function returns the memory-mapped vocabulary of a dictionary-encoded column: the
+        UTF-8 bytes of the value of each code'''
+        key = f'{col}{VOCABULARY}'
+        if key not in self._arrays:
+            self._arrays[key] = np.load(os.path.join(self.build_dir, key), mmap_mode='r')
+        
+        return self._arrays[key]
+
+    def column(self, col, rows=None):
+        '''This function returns one column as a series, dictionary-encoded columns as categoricals
+        over their vocabulary. rows (positions) limits it to those rows. Without rows numeric columns
+        are read-only views of the mapped file rather than copies. location is approximate: it is
+        formatted from lat/long, which the clean data holds as float32, so its trailing digits can
+        differ from the source text, and it is NaN where the coordinates are missing'''
+        if col == 'location':
+            lat, long = self.column('lat', rows), self.column('long', rows)
+            location = '(' + lat.map('{:.8f}'.format) + ', ' + long.map('{:.8f}'.format) + ')'
+            return location.mask(lat.isna() | long.isna()).rename('location')
+        values = self.array(col) if rows is None else self.array(col)[rows]
+        if self.schema['columns'][col]['kind'] == 'dictionary':
+            categories = pd.Index(np.char.decode(self.vocabulary(col), 'utf-8'), dtype=object)
+            values = pd.Categorical.from_codes(values, categories, validate=False)
+        
+        return pd.Series(values, name=col, copy=False)
+
+    def to_frame(self, columns=None, rows=None):
+        '''This function returns the clean crime dataframe (or the given columns of it, or the given
+        row positions) from the store. Dictionary-encoded columns come back as categoricals, which
+        is what the offense index and the daily cube work from'''
+        columns = list(self.schema['columns']) if columns is None else columns
+        
+        return pd.concat([self.column(col, rows) for col in columns], axis=1)
+
+@instrument.stage()
+def build_store(df=None, store_dir=STORE_DIR):
+    '''This function writes the incident store from the clean crime dataframe (get_clean_data() by
+    default), recording the source data fingerprint so a stale store can be detected'''
+    fingerprint = w.source_fingerprint()
+    df = w.get_clean_data() if df is None else df
+    write_store(df, store_dir, [list(item) for item in fingerprint])
+    
+    return IncidentStore(store_dir)
+
+def store_is_stale(store_dir=STORE_DIR):
+    '''This function checks whether the store is missing or was built from different source data'''
+    schema = read_schema(store_dir)
+    if schema is None:
+        return True
+    
+    return schema['fingerprint'] != [list(item) for item in w.source_fingerprint()]
+
+#Stores opened in this process, keyed by directory
+_stores = {}
+
+def get_store(store_dir=STORE_DIR):
+    '''This function returns the IncidentStore in store_dir, building it if it is missing or stale.
+    Each process opens a store once and keeps it until another process switches the store to a new
+    build; the mapped pages are shared between processes'''
+    key = os.path.abspath(store_dir)
+    if store_is_stale(store_dir):
+        _stores[key] = build_store(store_dir=store_dir)
+    elif key not in _stores or _stores[key].schema['build'] != read_schema(store_dir)['build']:
+        _stores[key] = IncidentStore(store_dir)
+    
+    return _stores[key]
+
+##------------------------Shared Workers----------------------##
+
+def _open_store(store_dir):
+    '''Process pool initializer: opens the store once per worker'''
+    _stores[os.path.abspath(store_dir)] = IncidentStore(store_dir)
+
+def _call_with_store(func, store_dir, item):
+    '''Runs one map_store call in a worker with its open store'''
+    return func(_stores[os.path.abspath(store_dir)], item)
+
+def map_store(func, items, store_dir=STORE_DIR, max_workers=None):
+    '''This function calls func(store, item) for every item across a process pool and returns the
+    results in order. Workers receive only the store directory and open the memory-mapped store
+    themselves, so the incident data is never pickled and all workers share one copy of it'''
+    get_store(store_dir)
+    items = list(items)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_open_store, initargs=(store_dir,)) as pool:
+        return list(pool.map(_call_with_store, [func] * len(items), [store_dir] * len(items), items))
+
+def category_daily(store, category):
+    '''This function returns the daily count_of_crime dataframe of one offense category, reading only
+    the description codes and dates of the store'''
+    df = store.to_frame(['offense_description', 'offense_code', 'occurred_on_date', 'district'])
+    
+    return c.build_daily_cube(df, [category]).series(category)
+
+def category_dailies(categories=tuple(w.OFFENSE_CATEGORIES), store_dir=STORE_DIR, max_workers=None):
+    '''This function returns {category: daily count_of_crime dataframe} for many offense categories,
+    computed in parallel from the shared store, as inputs for per-category model sweeps'''
+    categories = list(categories)
+    
+    return dict(zip(categories, map_store(category_daily, categories, store_dir, max_workers)))
@@ -0,0 +1,159 @@
+import signal
+import time
+import warnings
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import instrument
+
+
+##------------------------Model Grid--------------------------##
+
+def model_grid(windows=(7, 14, 30, 60, 90, 180, 365), periods=(7, 30, 365),
+               seasonals=('add', 'mul'), boxcox=(False, True)):
+    '''This function builds the default grid of model configurations to sweep: the simple average,
+    a moving average per window, Holt's linear trend with and without damping, and Holt-Winters
+    for every seasonal type x seasonal period x Box-Cox setting'''
+    grid = [{'model': 'simple_average'}]
+    grid += [{'model': 'moving_average', 'window': window} for window in windows]
+    grid += [{'model': 'holt', 'damped_trend': damped, 'use_boxcox': bc}
+             for damped in (False, True) for bc in boxcox]
+    grid += [{'model': 'holt_winters', 'trend': 'add', 'seasonal': seasonal, 'seasonal_periods': period,
+              'use_boxcox': bc}
+             for seasonal in seasonals for period in periods for bc in boxcox]
+    
+    return grid
+
+def model_name(config):
+    '''This function names a model configuration for the scores dataframe'''
+    if config['model'] == 'simple_average':
+        return 'simple_average'
+    if config['model'] == 'moving_average':
+        return f"{config['window']} d moving_average"
+    name = 'holts damped' if config['model'] == 'holt' and config.get('damped_trend') else 'holts'
+    if config['model'] == 'holt_winters':
+        name = f"holts seasonal {config['seasonal']} {config['seasonal_periods']}"
+    if config.get('use_boxcox'):
+        name += ' boxcox'
+    
+    return name
+
+##------------------------Fitting--------------------------##
+
+class FitTimeout(Exception):
+    '''Raised when a single model fit runs past its timeout'''
+
+def raise_timeout(signum, frame):
+    '''Signal handler turning SIGALRM into FitTimeout'''
+    raise FitTimeout()
+
+#Models fit with the simple/moving average rather than statsmodels
+AVERAGE_MODELS = ('simple_average', 'moving_average')
+
+def load_statsmodels():
+    '''This function imports statsmodels' exponential smoothing, which takes seconds the first time
+    in a process'''
+    from statsmodels.tsa.api import ExponentialSmoothing
+    
+    return ExponentialSmoothing
+
+@instrument.stage(describe=lambda config, *args, **kwargs: model_name(config))
+def fit_forecast(config, y, horizon):
+    '''This function fits one model configuration to the training values y and returns
+    (fitted values on train, forecast for the next horizon days)'''
+    if config['model'] == 'simple_average':
+        level = y.mean()
+        return np.full(len(y), level), np.full(horizon, level)
+    if config['model'] == 'moving_average':
+        level = y[-config['window']:].mean()
+        return np.full(len(y), level), np.full(horizon, level)
+    #statsmodels is only loaded once a model actually needs it
+    ExponentialSmoothing = load_statsmodels()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        if config['model'] == 'holt':
+            #Holt's linear trend is exponential smoothing with an additive trend and no season
+            fit = ExponentialSmoothing(y, trend='add', damped_trend=config.get('damped_trend', False),
+                                       use_boxcox=config.get('use_boxcox', False),
+                                       initialization_method='estimated').fit(optimized=True)
+        else:
+            fit = ExponentialSmoothing(y, trend=config.get('trend'), seasonal=config['seasonal'],
+                                       seasonal_periods=config['seasonal_periods'],
+                                       use_boxcox=config.get('use_boxcox', False),
+                                       initialization_method='estimated').fit()
+    
+    return np.asarray(fit.fittedvalues), np.asarray(fit.forecast(horizon))
+
+def rmse(actual, predicted):
+    '''This function returns the root mean squared error of two arrays, rounded to two places'''
+    if len(actual) == 0:
+        return np.nan
+    
+    return round(float(np.sqrt(np.mean((np.asarray(actual) - np.asarray(predicted)) ** 2))), 2)
+
+def score_config(config, train, validate, test=None, target_var='count_of_crime', timeout=None):
+    '''This function fits one configuration on train and scores its RMSE on train, validate and
+    test. Days missing from the daily dataframes had no crimes, so they are counted as zero (as
+    backtest.full_daily does): train is fit as a gap-free daily series, and validate and test are
+    scored on every day from the end of the period before them. Forecasts run from the day after
+    train ends. A fit taking longer than timeout seconds is abandoned (on platforms with
+    SIGALRM); errors and timeouts are reported in the error column rather than raised'''
+    row = {'model_name': model_name(config), 'train_score': np.nan, 'validate_score': np.nan,
+           'test_score': np.nan, 'seconds': np.nan, 'error': None, **config}
+    y = train[target_var].asfreq('D', fill_value=0).to_numpy(dtype=float)
+    last = train.index[-1]
+    #Each scored period as a gap-free daily series starting the day after the period before it
+    actuals, end = {}, last
+    for name, df in (('validate_score', validate), ('test_score', test)):
+        if df is not None and len(df):
+            days = pd.date_range(end + pd.Timedelta(days=1), df.index[-1], freq='D')
+            actuals[name], end = df[target_var].reindex(days, fill_value=0), df.index[-1]
+    horizon = max([(actual.index[-1] - last).days for actual in actuals.values()] or [1])
+    use_alarm = bool(timeout) and hasattr(signal, 'SIGALRM')
+    if config['model'] not in AVERAGE_MODELS:
+        #Import before arming the timer, so the timeout covers only the fit and an import cut short
+        #can't leave half-loaded modules behind for the worker's later fits
+        load_statsmodels()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    start = time.perf_counter()
+    try:
+        fitted, forecast = fit_forecast(config, y, horizon)
+    except FitTimeout:
+        row['error'] = f'timeout after {timeout}s'
+        return row
+    except Exception as err:
+        row['error'] = f'{type(err).__name__}: {err}'
+        return row
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        row['seconds'] = round(time.perf_counter() - start, 3)
+    row['train_score'] = rmse(y, fitted)
+    for name, actual in actuals.items():
+        #Forecast step of each date, counting the day after train ends as step one
+        steps = (actual.index - last).days.to_numpy() - 1
+        row[name] = rmse(actual, forecast[steps])
+    
+    return row
+
+##------------------------Sweep--------------------------##
+
+def run_sweep(train, validate, test=None, grid=None, target_var='count_of_crime', max_workers=None,
+              timeout=120):
+    '''This function fits every configuration in grid (model_grid() by default) on train concurrently
+    across a process pool, each with its own timeout in seconds, and returns one scores dataframe
+    of train, validate and test RMSE sorted by validate score'''
+    grid = model_grid() if grid is None else grid
+    n = len(grid)
+    args = ([train] * n, [validate] * n, [test] * n, [target_var] * n, [timeout] * n)
+    if max_workers == 1:
+        rows = list(map(score_config, grid, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            rows = list(pool.map(score_config, grid, *args))
+    scores = pd.DataFrame(rows)
+    
+    return scores.sort_values('validate_score', na_position='last').reset_index(drop=True)
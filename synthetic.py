@@ -0,0 +1,223 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+##------------------------Schema----------------------##
+
+#Columns of the yearly files from the Boston Crime Incident Reports website, in file order
+COLUMNS = ['INCIDENT_NUMBER', 'OFFENSE_CODE', 'OFFENSE_CODE_GROUP', 'OFFENSE_DESCRIPTION', 'DISTRICT',
+           'REPORTING_AREA', 'SHOOTING', 'OCCURRED_ON_DATE', 'YEAR', 'MONTH', 'DAY_OF_WEEK', 'HOUR',
+           'UCR_PART', 'STREET', 'Lat', 'Long', 'Location']
+
+#(offense_code, offense_code_group, offense_description, ucr_part), most frequent first
+OFFENSES = [
+    (3115, 'Investigate Person', 'INVESTIGATE PERSON', 'Part Three'),
+    (3831, 'Motor Vehicle Accident Response', 'M/V - LEAVING SCENE - PROPERTY DAMAGE', 'Part Three'),
+    (1402, 'Vandalism', 'VANDALISM', 'Part Two'),
+    (3006, 'Medical Assistance', 'SICK/INJURED/MEDICAL - PERSON', 'Part Three'),
+    (3301, 'Verbal Disputes', 'VERBAL DISPUTE', 'Part Three'),
+    (614, 'Larceny From Motor Vehicle', 'LARCENY THEFT FROM MV - NON-ACCESSORY', 'Part One'),
+    (3114, 'Investigate Property', 'INVESTIGATE PROPERTY', 'Part Three'),
+    (3410, 'Towed', 'TOWED MOTOR VEHICLE', 'Part Three'),
+    (801, 'Simple Assault', 'ASSAULT - SIMPLE', 'Part Two'),
+    (619, 'Larceny', 'LARCENY ALL OTHERS', 'Part One'),
+    (3201, 'Property Lost', 'PROPERTY - LOST', 'Part Three'),
+    (613, 'Larceny', 'LARCENY SHOPLIFTING', 'Part One'),
+    (3802, 'Motor Vehicle Accident Response', 'M/V ACCIDENT - PROPERTY  DAMAGE', 'Part Three'),
+    (2647, 'Other', 'THREATS TO DO BODILY HARM', 'Part Two'),
+    (617, 'Larceny', 'LARCENY THEFT FROM BUILDING', 'Part One'),
+    (3125, 'Warrant Arrests', 'WARRANT ARREST', 'Part Three'),
+    (2629, 'Harassment', 'HARASSMENT', 'Part Two'),
+    (413, 'Aggravated Assault', 'ASSAULT - AGGRAVATED - BATTERY', 'Part One'),
+    (1106, 'Fraud', 'FRAUD - CREDIT CARD / ATM FRAUD', 'Part Two'),
+    (3207, 'Property Found', 'PROPERTY - FOUND', 'Part Three'),
+    (1102, 'Fraud', 'FRAUD - FALSE PRETENSE / SCHEME', 'Part Two'),
+    (2907, 'Violations', 'VAL - OPERATING AFTER REV/SUSP.', 'Part Two'),
+    (724, 'Auto Theft', 'AUTO THEFT', 'Part One'),
+    (520, 'Residential Burglary', 'BURGLARY - RESIDENTIAL - FORCE', 'Part One'),
+    (1107, 'Fraud', 'FRAUD - IMPERSONATION', 'Part Two'),
+    (2610, 'Other', 'TRESPASSING', 'Part Two'),
+    (1843, 'Drug Violation', 'DRUGS - POSS CLASS B - COCAINE, ETC.', 'Part Two'),
+    (301, 'Robbery', 'ROBBERY - STREET', 'Part One'),
+    (3803, 'Motor Vehicle Accident Response', 'M/V ACCIDENT - PERSONAL INJURY', 'Part Three'),
+    (1001, 'Counterfeiting', 'FORGERY / COUNTERFEITING', 'Part Two'),
+    (1108, 'Fraud', 'FRAUD - WIRE', 'Part Two'),
+    (611, 'Larceny', 'LARCENY PURSE SNATCH - NO FORCE', 'Part One'),
+    (1849, 'Drug Violation', 'DRUGS - POSS CLASS B - INTENT TO MFR DIST DISP', 'Part Two'),
+    (540, 'Commercial Burglary', 'BURGLARY - COMMERCIAL - FORCE', 'Part One'),
+    (1501, 'Firearm Violations', 'WEAPON - FIREARM - CARRYING / POSSESSING, ETC', 'Part Two'),
+    (3018, 'Police Service Incidents', 'SERVICE TO OTHER PD INSIDE OF MA.', 'Part Three'),
+    (2662, 'Other', 'ANIMAL INCIDENTS', 'Part Two'),
+    (1109, 'Fraud', 'FRAUD - WELFARE', 'Part Two'),
+    (3108, 'Fire Related Reports', 'FIRE REPORT - HOUSE, BUILDING, ETC.', 'Part Three'),
+    (311, 'Robbery', 'ROBBERY - COMMERCIAL', 'Part One'),
+    (1503, 'Firearm Violations', 'WEAPON - OTHER - CARRYING / POSSESSING, ETC', 'Part Two'),
+    (1810, 'Drug Violation', 'DRUGS - POSS CLASS D - INTENT TO MFR DIST DISP', 'Part Two'),
+    (1805, 'Drug Violation', 'DRUGS - CLASS D TRAFFICKING OVER 50 GRAMS', 'Part Two'),
+    (2900, 'Other', 'VAL - VIOLATION OF AUTO LAW - OTHER', 'Part Two'),
+    (1002, 'Counterfeiting', 'FORGERY OR UTTERING', 'Part Two'),
+    (2511, 'Other', 'KIDNAPPING - ENTICING OR ATTEMPTED', 'Part Two'),
+    (111, 'Homicide', 'MURDER, NON-NEGLIGIENT MANSLAUGHTER', 'Part One'),
+]
+
+#(district, share of incidents, latitude, longitude of its center)
+DISTRICTS = [
+    ('B2', 0.16, 42.318, -71.084), ('C11', 0.13, 42.298, -71.059), ('D4', 0.13, 42.342, -71.077),
+    ('A1', 0.11, 42.356, -71.060), ('B3', 0.11, 42.284, -71.091), ('C6', 0.07, 42.333, -71.050),
+    ('D14', 0.06, 42.350, -71.151), ('E18', 0.06, 42.256, -71.124), ('E13', 0.06, 42.310, -71.110),
+    ('E5', 0.05, 42.287, -71.150), ('A7', 0.04, 42.374, -71.030), ('A15', 0.015, 42.379, -71.064),
+    ('External', 0.003, 42.330, -71.070), (' ', 0.002, 42.330, -71.070),
+]
+
+STREETS = ['WASHINGTON ST', 'BLUE HILL AVE', 'BOYLSTON ST', 'DORCHESTER AVE', 'TREMONT ST',
+           'MASSACHUSETTS AVE', 'HARRISON AVE', 'CENTRE ST', 'COMMONWEALTH AVE', 'HYDE PARK AVE',
+           'NEWBURY ST', 'COLUMBIA RD', 'HUNTINGTON AVE', 'CAMBRIDGE ST', 'GENEVA AVE',
+           'MORTON ST', 'WARREN ST', 'RIVER ST', 'GALLIVAN BLVD', 'BROADWAY']
+
+#Qualifiers the tail of rarer offense descriptions adds to the common ones, as the real extract's
+#subtypes do (e.g. "ASSAULT - SIMPLE - DOMESTIC")
+QUALIFIERS = ['ATTEMPT', 'DOMESTIC', 'JUVENILE', 'WITH DANGEROUS WEAPON', 'ON SCHOOL PROPERTY',
+              'FROM PERSON', 'OVER $250', 'UNDER $250', 'MBTA', 'PUBLIC HOUSING']
+#Distinct offense descriptions generated by default; the real extract has a few hundred
+N_OFFENSES = 250
+
+#Year from which the website changed its conventions: offense_code_group is blank and
+#shooting is 0/1 instead of "Y"/blank
+NEW_SCHEMA_YEAR = 2019
+#Year from which occurred_on_date carries a "+00" UTC offset
+UTC_OFFSET_YEAR = 2022
+
+##------------------------Generate----------------------##
+
+def zipf_weights(n, exponent=1.0):
+    '''This function returns Zipf-like probabilities for n values listed most frequent first'''
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    
+    return weights / weights.sum()
+
+def offense_table(n_offenses=N_OFFENSES):
+    '''This function returns n_offenses (offense_code, group, description, ucr_part) rows, most frequent
+    first: OFFENSES followed by a long tail of qualified variants of them, each with its own unused
+    offense code'''
+    table = list(OFFENSES)
+    used = {offense[0] for offense in OFFENSES}
+    free_codes = (code for code in range(100, 10_000) if code not in used)
+    for qualifier in QUALIFIERS:
+        for code, group, description, ucr_part in OFFENSES:
+            if len(table) >= n_offenses:
+                return table[:n_offenses]
+            table.append((next(free_codes), group, f'{description} - {qualifier}', ucr_part))
+    
+    return table[:n_offenses]
+
+def random_dates(year, n, rng):
+    '''This function returns n occurrence times within year, with a mild summer peak and fewer
+    crimes in the early morning hours'''
+    days = pd.date_range(f'{year}-01-01', f'{year}-12-31', freq='D')
+    season = 1 + 0.15 * np.sin(2 * np.pi * (days.dayofyear.to_numpy() - 100) / 365)
+    day = rng.choice(len(days), n, p=season / season.sum())
+    hour_weights = 1.5 + np.cos(2 * np.pi * (np.arange(24) - 15) / 24)
+    hour = rng.choice(24, n, p=hour_weights / hour_weights.sum())
+    seconds = hour * 3600 + rng.integers(0, 3600, n)
+    
+    return days[day] + pd.to_timedelta(seconds, unit='s')
+
+def make_chunk(year, n, rng, first_incident=0, multi_offense=0.1, missing_location=0.04,
+               n_offenses=N_OFFENSES):
+    '''This function returns n synthetic incident rows for year in the yearly file schema. A share of
+    rows (multi_offense) repeat the previous incident number with another offense, as incidents with
+    several offenses do. Incident numbers continue from first_incident. Offenses are drawn from
+    offense_table(n_offenses) with Zipf-like frequencies'''
+    new_schema = year >= NEW_SCHEMA_YEAR
+    offenses = offense_table(n_offenses)
+    offense = rng.choice(len(offenses), n, p=zipf_weights(len(offenses)))
+    #The first row always starts a new incident
+    new_incident = rng.random(n) >= multi_offense
+    new_incident[0] = True
+    incident = first_incident + np.cumsum(new_incident) - 1
+    #Further offenses of an incident differ from the one before
+    repeat = ~new_incident & (offense == np.roll(offense, 1))
+    offense[repeat] = (offense[repeat] + 1) % len(offenses)
+    #Row of every incident's first offense; the time and place are shared by its offenses
+    first_row = np.maximum.accumulate(np.where(new_incident, np.arange(n), 0))
+    codes, groups, descriptions, ucr_parts = map(list, zip(*offenses))
+    if new_schema:
+        #Recent files mix in title-case descriptions for some offenses
+        descriptions = descriptions + [d.capitalize() for d in descriptions]
+        offense = offense + len(offenses) * (rng.random(n) < 0.05)
+    district_names, shares, center_lat, center_long = (np.array(values) for values in zip(*DISTRICTS))
+    district = rng.choice(len(DISTRICTS), n, p=shares / shares.sum())[first_row]
+    dates = random_dates(year, n, rng)[first_row]
+    #Coordinates scattered around each district's center, some missing
+    lat = np.round(center_lat[district] + rng.normal(0, 0.012, n)[first_row], 8)
+    long = np.round(center_long[district] + rng.normal(0, 0.012, n)[first_row], 8)
+    missing = (rng.random(n) < missing_location)[first_row]
+    lat[missing] = 0 if new_schema else np.nan
+    long[missing] = 0 if new_schema else np.nan
+    location = ('(' + pd.Series(np.nan_to_num(lat)).map('{:.8f}'.format) + ', '
+                + pd.Series(np.nan_to_num(long)).map('{:.8f}'.format) + ')')
+    reporting_area = rng.integers(1, 963, n).astype(str).astype(object)
+    reporting_area[rng.random(n) < 0.06] = ' '
+    reporting_area = reporting_area[first_row]
+    shooting = rng.random(n) < 0.004
+    street_weights = np.append(zipf_weights(len(STREETS), 0.6) * 0.97, 0.03)
+    street = rng.choice(len(STREETS) + 1, n, p=street_weights)[first_row]
+    ucr_part = np.array(ucr_parts + [None], dtype=object)[np.where(rng.random(n) < 0.003, len(offenses),
+                                                                   offense % len(offenses))]
+    
+    return pd.DataFrame({
+        'INCIDENT_NUMBER': f'I{year % 100:02d}' + pd.Series(incident).astype(str).str.zfill(7),
+        'OFFENSE_CODE': np.array(codes)[offense % len(offenses)],
+        'OFFENSE_CODE_GROUP': None if new_schema else np.array(groups, dtype=object)[offense],
+        'OFFENSE_DESCRIPTION': pd.Categorical.from_codes(offense, descriptions),
+        'DISTRICT': pd.Categorical.from_codes(district, district_names),
+        'REPORTING_AREA': reporting_area,
+        'SHOOTING': shooting.astype(int) if new_schema else np.where(shooting, 'Y', None),
+        'OCCURRED_ON_DATE': dates,
+        'YEAR': year,
+        'MONTH': dates.month,
+        'DAY_OF_WEEK': dates.day_name(),
+        'HOUR': dates.hour,
+        'UCR_PART': ucr_part,
+        'STREET': np.array(STREETS + [' '], dtype=object)[street],
+        'Lat': lat,
+        'Long': long,
+        'Location': location,
+    }, columns=COLUMNS)
+
+def write_year(year, rows, directory='.', seed=0, chunksize=1_000_000, n_offenses=N_OFFENSES):
+    '''This function writes rows synthetic incidents for year to crime-incident-reports-YEAR.csv in
+    directory, chunksize rows at a time so memory stays flat at any scale. Each chunk has its own
+    generator seeded from (seed, year, chunk), so the file is the same for the same arguments.
+    Returns the path'''
+    path = os.path.join(directory, f'crime-incident-reports-{year}.csv')
+    date_format = '%Y-%m-%d %H:%M:%S' + ('+00' if year >= UTC_OFFSET_YEAR else '')
+    incidents = 0
+    for number, start in enumerate(range(0, rows, chunksize)):
+        rng = np.random.default_rng([seed, year, number])
+        chunk = make_chunk(year, min(chunksize, rows - start), rng, first_incident=incidents,
+                           n_offenses=n_offenses)
+        incidents = int(chunk['INCIDENT_NUMBER'].iat[-1][3:]) + 1
+        chunk.to_csv(path, mode='w' if number == 0 else 'a', header=number == 0, index=False,
+                     date_format=date_format)
+    
+    return path
+
+def generate(rows, years=range(2015, 2023), directory='.', seed=0, chunksize=1_000_000,
+             n_offenses=N_OFFENSES):
+    '''This function writes a deterministic synthetic copy of the yearly crime incident report files,
+    rows incidents in total spread evenly over years, and returns their paths. Scales from thousands
+    to hundreds of millions of rows; n_offenses sets the number of distinct offense descriptions.
+    See make_chunk for what the rows look like'''
+    years = list(years)
+    os.makedirs(directory, exist_ok=True)
+    per_year = np.full(len(years), rows // len(years))
+    per_year[:rows % len(years)] += 1
+    
+    return [write_year(year, int(n), directory, seed, chunksize, n_offenses)
+            for year, n in zip(years, per_year)]
+
+if __name__ == '__main__':
+    import sys
+    generate(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000, directory=sys.argv[2] if len(sys.argv) > 2 else '.')
@@ -1,116 +1,608 @@
+import os
+import io
+import json
+import hashlib
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+import memo
+import instrument
 
-def aggregate_csv():
+##------------------------Acquire----------------------##
+
+#File name pattern of the yearly files from the Boston Crime Incident Reports website
+CSV_PATTERN = 'crime-incident-reports-*.csv'
+
+#Column dtypes to use when reading the yearly files, keyed by lowercase column name
+DTYPES = {
+    'incident_number': 'object',
+    'offense_code': 'int32',
+    'offense_code_group': 'category',
+    'offense_description': 'category',
+    'district': 'category',
+    'reporting_area': 'object',
+    'occurred_on_date': 'object',
+    'year': 'int16',
+    'month': 'int8',
+    'day_of_week': 'category',
+    'hour': 'int8',
+    'ucr_part': 'category',
+    'street': 'object',
+    'lat': 'float32',
+    'long': 'float32',
+    'location': 'object',
+}
+
+def get_yearly_files(pattern=CSV_PATTERN):
+    '''This function returns the sorted list of yearly crime report files matching pattern'''
+    return sorted(glob(pattern))
+
+def read_yearly_csv(path, offset=0, size=None):
+    '''This function reads one yearly crime report file using the DTYPES schema. Column names
+    in the raw files vary in case (e.g. OFFENSE_CODE, Lat), so the schema is matched on the
+    lowercase name and the original column names are kept. A non-zero offset reads only the
+    rows starting at that byte offset, which must be the start of a line, up to byte size (the
+    end of the file by default)'''
+    #Read only the header to match the schema to this file's column names
+    columns = pd.read_csv(path, nrows=0).columns
+    dtype = {col: DTYPES[col.lower()] for col in columns if col.lower() in DTYPES}
+    if offset == 0:
+        return pd.read_csv(path, dtype=dtype)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        rows = f.read() if size is None else f.read(size - offset)
+    
+    return pd.read_csv(io.BytesIO(rows), header=None, names=columns, dtype=dtype)
+
+def concat_frames(frames):
+    '''This function concatenates yearly dataframes, unioning the categories of categorical
+    columns first so they stay categorical instead of falling back to object'''
+    for col in frames[0].columns:
+        if not all(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames if col in f):
+            continue
+        #Union of categories across every file, in first-seen order
+        categories = pd.Index(pd.unique(np.concatenate([f[col].cat.categories.to_numpy(dtype=object)
+                                                        for f in frames if col in f])))
+        for f in frames:
+            if col in f:
+                f[col] = f[col].cat.set_categories(categories)
+    
+    return pd.concat(frames, ignore_index=True)
+
+@instrument.stage()
+def acquire_data(pattern=CSV_PATTERN, max_workers=None):
+    '''This function finds every yearly crime report file matching pattern, reads them in parallel
+    across a process pool with the DTYPES schema, and returns one dataframe with all project data'''
+    paths = get_yearly_files(pattern)
+    if not paths:
+        raise FileNotFoundError(f'No files match {pattern!r}')
+    #A single file isn't worth starting a pool for
+    if len(paths) == 1:
+        return read_yearly_csv(paths[0])
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        frames = list(pool.map(read_yearly_csv, paths))
+    
+    return concat_frames(frames)
+
+@instrument.stage()
+def aggregate_csv(pattern=CSV_PATTERN):
     '''This function concatenates all yearly crime reports and returns one 
     dataframe with all project data'''
-    #Get data from CSV files
-    df2015 = pd.read_csv("crime-incident-reports-2015.csv")
-    df2016 = pd.read_csv("crime-incident-reports-2016.csv")
-    df2017 = pd.read_csv("crime-incident-reports-2017.csv")
-    df2018 = pd.read_csv("crime-incident-reports-2018.csv")
-    df2019 = pd.read_csv("crime-incident-reports-2019.csv")
-    df2020 = pd.read_csv("crime-incident-reports-2020.csv")
-    df2021 = pd.read_csv("crime-incident-reports-2021.csv")
-    df2022 = pd.read_csv("crime-incident-reports-2022.csv")
-    # # Forming a table from DFs
-    table = []
-    table.append(df2015)
-    table.append(df2016)
-    table.append(df2017)
-    table.append(df2018)
-    table.append(df2019)
-    table.append(df2020)
-    table.append(df2021)
-    table.append(df2022)
-    # # #Combine all tables, ignore index
-    df = pd.concat(table, ignore_index=True)
-    # #Save data as combined csv
+    #Read the yearly files in parallel and combine them
+    df = acquire_data(pattern)
+    #Save data as combined csv
     df.to_csv('boston_crime.csv')
-    #Get CSV from file
-    df = pd.read_csv('boston_crime.csv', index_col=0)
     
     return df
 
 
-def combine_data():
+def combine_data(pattern=CSV_PATTERN):
     ''' Combine retrieved CSV files from Boston Crime Incident Reports Website
     (https://data.boston.gov/dataset/crime-incident-reports-august-2015-to-date-source-new-system)
     into one CSV, and returns a data frame. This function should be used once all files are downloaded
     from the Boston Crime Incident Reports are downloaded and appropriately named
     '''
-    #get my data from csv files
-    df2015 = pd.read_csv("crime-incident-reports-2015.csv")
-    df2016 = pd.read_csv("crime-incident-reports-2016.csv")
-    df2017 = pd.read_csv("crime-incident-reports-2017.csv")
-    df2018 = pd.read_csv("crime-incident-reports-2018.csv")
-    df2019 = pd.read_csv("crime-incident-reports-2019.csv")
-    df2020 = pd.read_csv("crime-incident-reports-2020.csv")
-    df2021 = pd.read_csv("crime-incident-reports-2021.csv")
-    df2022 = pd.read_csv("crime-incident-reports-2022.csv")
-    #Forming a table from DFs
-    table = []
-    table.append(df2015)
-    table.append(df2016)
-    table.append(df2017)
-    table.append(df2018)
-    table.append(df2019)
-    table.append(df2020)
-    table.append(df2021)
-    table.append(df2022)
-    #Combine all tables, ignore index
-    df = pd.concat(table, ignore_index=True)
+    #Read the yearly files in parallel and combine them
+    df = acquire_data(pattern)
     #Save data as combined csv
     df.to_csv('boston_crime.csv')
     
     return df
 
-def get_clean_data():
-    '''This function takes in the Boston Crime dataframe from a csv file and addresses the messiness
+##------------------------Prepare----------------------##
+
+def parse_dates(dates):
+    '''This function parses occurred_on_date strings into naive datetimes. Newer yearly files
+    carry a "+00" offset while older ones don't, so everything is read as UTC and the offset is
+    dropped to keep the reported wall-clock times'''
+    return pd.to_datetime(dates, utc=True, format='ISO8601').dt.tz_localize(None)
+
+#Columns stored as categoricals once cleaned
+CATEGORY_COLUMNS = ['offense_code_group', 'offense_description', 'district', 'day_of_week', 'ucr_part']
+#Columns whose values are lowercased during cleaning
+LOWERCASE_COLUMNS = ['offense_code_group', 'offense_description']
+#Columns where a missing value becomes the "unknown" category
+UNKNOWN_COLUMNS = ['offense_code_group', 'ucr_part']
+
+def blank_mask(values):
+    '''This function returns a boolean mask of values that are empty or only whitespace,
+    without running a regex over every value'''
+    values = pd.Series(values, dtype=object)
+    
+    return (values.str.isspace() | values.eq('')).fillna(False).to_numpy(dtype=bool)
+
+def map_categories(s, func):
+    '''This function applies func to the categories of a categorical series instead of to every row.
+    func takes an Index of the categories (with a trailing NaN standing in for missing rows) and
+    returns their new values; values mapping to NaN become missing and values mapping to the same
+    value are merged'''
+    new = pd.Index(func(s.cat.categories.append(pd.Index([np.nan]))), dtype=object)
+    valid = new.notna()
+    categories = new[valid].unique()
+    #lookup[code] is the new code for an old code; missing rows have code -1, the trailing NaN
+    lookup = np.full(len(new), -1, dtype=np.int32)
+    lookup[valid] = categories.get_indexer(new[valid])
+    codes = lookup[s.cat.codes.to_numpy()]
+    
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=s.index, name=s.name)
+
+def normalize_categories(categories, lower=False, unknown=False):
+    '''This function cleans the category values of one column: blanks become NaN, and optionally
+    values are lowercased and NaN is replaced with "unknown"'''
+    values = pd.Series(categories, dtype=object)
+    values[blank_mask(values)] = np.nan
+    if lower:
+        values = values.str.lower()
+    if unknown:
+        values = values.fillna('unknown')
+    
+    return values
+
+@instrument.stage()
+def clean_data(df):
+    '''This function takes in the combined Boston Crime dataframe and addresses the messiness
     by renaming columns, filling whitespace, imputing NaN values, standardizing field values, and recasting
-    data types'''
-    #Get CSV from file
-    df = pd.read_csv('boston_crime.csv', index_col=0)
+    data types. Each column is cleaned once: categorical columns are normalized per unique value,
+    other string columns get a vectorized blank check and numeric columns are left alone'''
     #Rename columns to remove capital letters
     df.columns = df.columns.str.lower()
-    #Replace a whitespace sequence or empty with a NaN value and reassign this manipulation to df
-    df = df.replace(r'^\s*$', np.nan, regex=True)
-    #Replace NaN values in offense code group with unknown
-    df['offense_code_group'].fillna("unknown", inplace=True)
-    #Changing Y in shooting to 1(Yes)
-    df.loc[df["shooting"] == "Y", "shooting"] = 1
-    #Replace Nan Values in shooting with zeroes
-    df['shooting'].fillna(0, inplace=True)
-    #Recasting shooting column as an integer
-    df['shooting'] = df['shooting'].astype(int)
-    #Replace NaN values in ucr part with unknown
-    df['ucr_part'].fillna("unknown", inplace=True)
-    #Going to fill NaN with zeroes for reporting area, which represents where a crime is reported from
-    df['reporting_area'].fillna(0, inplace=True)
-    #Make everything lowercase in offense code group and description
-    df['offense_code_group'] = df['offense_code_group'].str.lower()
-    df['offense_description'] = df['offense_description'].str.lower()
+    for col in df.columns:
+        s = df[col]
+        if col in CATEGORY_COLUMNS:
+            #Whitespace to NaN, lowercase and fill unknowns once per category, not once per row
+            if not isinstance(s.dtype, pd.CategoricalDtype):
+                s = s.astype('category')
+            df[col] = map_categories(s, lambda cats: normalize_categories(
+                cats, lower=col in LOWERCASE_COLUMNS, unknown=col in UNKNOWN_COLUMNS))
+        elif col == 'shooting':
+            #Y (older files) or 1 (newer files) is a shooting, anything else including NaN is not
+            df[col] = s.isin(['Y', 1, '1']).astype(int)
+        elif col == 'reporting_area':
+            #Blanks and NaN become zero for reporting area, which represents where a crime is reported from
+            df[col] = pd.to_numeric(s, errors='coerce').fillna(0).astype(int)
+        elif col == 'occurred_on_date':
+            #Occurred on date is an object, lets make it date time
+            df[col] = parse_dates(s)
+        elif s.dtype == object:
+            #Replace a whitespace sequence or empty with a NaN value
+            mask = blank_mask(s)
+            if mask.any():
+                df[col] = s.mask(mask)
+    
+    return df
+
+##------------------------Streaming----------------------##
+
+def iter_clean_chunks(path, chunksize=100_000, columns=None):
+    '''This function reads one yearly file in chunks of chunksize rows with the DTYPES schema and
+    yields each chunk cleaned with clean_data, so only one chunk is in memory at a time. columns
+    (lowercase names) limits the columns read'''
+    header = pd.read_csv(path, nrows=0).columns
+    dtype = {col: DTYPES[col.lower()] for col in header if col.lower() in DTYPES}
+    usecols = None if columns is None else [col for col in header if col.lower() in columns]
+    for chunk in pd.read_csv(path, dtype=dtype, usecols=usecols, chunksize=chunksize):
+        yield clean_data(chunk)
+
+##------------------------Parquet Cache----------------------##
+
+#Directory holding the cleaned data, one directory of parquet parts per year
+CACHE_DIR = 'boston_crime_cache'
+#File in CACHE_DIR recording the source files the cache was built from
+MANIFEST = 'manifest.json'
+#Columns identifying one offense of one incident, used to drop re-published rows
+INCIDENT_KEY = ['incident_number', 'offense_code']
+
+#Bytes per hashed block of a source file. A file that grew by appending keeps the hashes of its
+#earlier blocks, so only its last blocks are hashed again
+HASH_BLOCK = 1 << 20
+
+def block_hashes(path, start=0, end=None):
+    '''This function returns the sha1 hex digests of the HASH_BLOCK-byte blocks of a file, from block
+    start up to byte end (the end of the file by default); the last block may be shorter'''
+    end = os.path.getsize(path) if end is None else end
+    hashes, position = [], start * HASH_BLOCK
+    with open(path, 'rb') as f:
+        f.seek(position)
+        while position < end:
+            block = f.read(min(HASH_BLOCK, end - position))
+            if not block:
+                break
+            hashes.append(hashlib.sha1(block).hexdigest())
+            position += len(block)
+    
+    return hashes
+
+def combine_hashes(blocks):
+    '''This function returns the content hash of a file from the hashes of its blocks'''
+    return hashlib.sha1(''.join(blocks).encode()).hexdigest()
+
+def file_state(path, size=None, blocks=None):
+    '''This function records the modification time, size, block hashes and content hash of a source
+    file, or of its first size bytes. blocks are the block hashes if they are already known'''
+    mtime = os.path.getmtime(path)
+    size = os.path.getsize(path) if size is None else size
+    blocks = block_hashes(path, end=size) if blocks is None else blocks
+    
+    return {'mtime': mtime, 'size': size, 'sha1': combine_hashes(blocks), 'blocks': blocks}
+
+def source_state(paths):
+    '''This function records the state of each source file (see file_state), keyed by file name'''
+    return {os.path.basename(path): file_state(path) for path in paths}
+
+def read_manifest(cache_dir=CACHE_DIR):
+    '''This function returns the cache manifest, or None if no cache has been written'''
+    path = os.path.join(cache_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def write_manifest(manifest, cache_dir=CACHE_DIR):
+    '''This function writes the cache manifest'''
+    with open(os.path.join(cache_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def remove_manifest(cache_dir=CACHE_DIR):
+    '''This function removes the cache manifest, marking the cache stale while it is written'''
+    path = os.path.join(cache_dir, MANIFEST)
+    if os.path.exists(path):
+        os.remove(path)
+
+def cache_is_stale(pattern=CSV_PATTERN, cache_dir=CACHE_DIR):
+    '''This function checks the cache against the yearly source files. A file whose modification
+    time and size are unchanged is trusted, and one whose size changed needs updating without being
+    read; a file with a new modification time but the same size is rehashed, so touching it without
+    changing its contents doesn't force a rebuild. Returns True if the cache needs updating'''
+    manifest = read_manifest(cache_dir)
+    if manifest is None:
+        return True
+    paths = get_yearly_files(pattern)
+    sources = manifest['sources']
+    if sorted(os.path.basename(path) for path in paths) != sorted(sources):
+        return True
+    for path in paths:
+        recorded = sources[os.path.basename(path)]
+        if os.path.getsize(path) != recorded['size']:
+            return True
+        if os.path.getmtime(path) == recorded['mtime']:
+            continue
+        if combine_hashes(block_hashes(path)) != recorded['sha1']:
+            return True
+    
+    return False
+
+def year_parts(year, cache_dir=CACHE_DIR):
+    '''This function returns the parquet parts holding one year of the cache, in write order'''
+    paths = glob(os.path.join(cache_dir, f'year={year}', 'part-*.parquet'))
+    
+    return sorted(paths, key=lambda path: int(os.path.basename(path)[5:-8]))
+
+def next_part_path(year, cache_dir=CACHE_DIR):
+    '''This function returns the path of a new parquet part for one year of the cache'''
+    directory = os.path.join(cache_dir, f'year={year}')
+    os.makedirs(directory, exist_ok=True)
+    
+    return os.path.join(directory, f'part-{len(year_parts(year, cache_dir))}.parquet')
+
+def write_cache(df, sources, cache_dir=CACHE_DIR):
+    '''This function writes the cleaned dataframe to cache_dir partitioned by year, then writes the
+    manifest of source files. The manifest goes last so an interrupted write reads as stale'''
+    remove_manifest(cache_dir)
+    for year, year_df in df.groupby('year', sort=True):
+        for path in year_parts(year, cache_dir):
+            os.remove(path)
+        year_df.to_parquet(next_part_path(year, cache_dir), index=False)
+    write_manifest({'years': sorted(int(year) for year in df['year'].unique()), 'sources': sources}, cache_dir)
+
+@instrument.stage()
+def build_cache(pattern=CSV_PATTERN, cache_dir=CACHE_DIR):
+    '''This function acquires the yearly files, cleans them and writes the parquet cache.
+    This is the wrangle stage; everything downstream reads the cache. Rows repeating an
+    incident_number and offense_code are dropped, as update_cache does'''
+    paths = get_yearly_files(pattern)
+    df = clean_data(acquire_data(pattern)).drop_duplicates(INCIDENT_KEY, ignore_index=True)
+    write_cache(df, source_state(paths), cache_dir)
+    
+    return df
+
+@instrument.stage()
+def read_cache(columns=None, years=None, start=None, end=None, cache_dir=CACHE_DIR):
+    '''This function reads the cleaned data from the parquet cache. columns limits the columns read,
+    years limits the yearly partitions opened, and start/end (inclusive) filter on occurred_on_date
+    inside the parquet reader'''
+    manifest = read_manifest(cache_dir)
+    if manifest is None:
+        raise FileNotFoundError(f'No parquet cache in {cache_dir!r}, run build_cache() first')
+    start = pd.Timestamp(start) if start is not None else None
+    #An end date with no time means the whole of that day
+    end = pd.Timestamp(end) if end is not None else None
+    if (end is not None) and (end == end.normalize()):
+        end = end + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')
+    #Partition pruning: only open the years that can hold matching rows
+    wanted = [year for year in manifest['years']
+              if ((years is None) or (year in years))
+              and ((start is None) or (year >= start.year))
+              and ((end is None) or (year <= end.year))]
+    filters = []
+    if start is not None:
+        filters.append(('occurred_on_date', '>=', start))
+    if end is not None:
+        filters.append(('occurred_on_date', '<=', end))
+    frames = [pd.read_parquet(path, columns=columns, filters=filters or None)
+              for year in wanted for path in year_parts(year, cache_dir)]
+    if not frames:
+        return pd.read_parquet(year_parts(manifest['years'][0], cache_dir)[0], columns=columns).iloc[:0]
+    
+    return concat_frames(frames)
+
+##------------------------Incremental Updates----------------------##
+
+def appended_blocks(path, recorded, size):
+    '''This function checks whether a source file only had whole rows appended since it was recorded
+    in the manifest, i.e. its first recorded size bytes are unchanged and end in a newline. If so it
+    returns the block hashes of its first size bytes, reading the recorded bytes once to check them
+    against their block hashes and hashing only the blocks past them; otherwise None'''
+    if (size <= recorded['size']) or ('blocks' not in recorded):
+        return None
+    with open(path, 'rb') as f:
+        f.seek(recorded['size'] - 1)
+        if f.read(1) != b'\n':
+            return None
+    if block_hashes(path, end=recorded['size']) != recorded['blocks']:
+        return None
+    #The last recorded block may have been partial; it is hashed again with the rows appended to it
+    kept = recorded['size'] // HASH_BLOCK
+    
+    return recorded['blocks'][:kept] + block_hashes(path, kept, size)
+
+def drop_known_incidents(delta, year, cache_dir=CACHE_DIR):
+    '''This function drops rows of one year of new data whose incident_number and offense_code
+    are already in that year of the cache. Only the cached keys of the new incident numbers are
+    read, filtered inside the parquet reader'''
+    numbers = delta['incident_number'].dropna().unique().tolist()
+    parts = year_parts(year, cache_dir)
+    if not (numbers and parts):
+        return delta
+    frames = [pd.read_parquet(path, columns=INCIDENT_KEY, filters=[('incident_number', 'in', numbers)])
+              for path in parts]
+    known = pd.MultiIndex.from_frame(pd.concat(frames, ignore_index=True))
+    
+    return delta[~pd.MultiIndex.from_frame(delta[INCIDENT_KEY]).isin(known)]
+
+def rebuild_cache(pattern=CSV_PATTERN, cache_dir=CACHE_DIR, cubes=()):
+    '''This function rebuilds the parquet cache from the yearly files and rebuilds each cube.DailyCube
+    in cubes from the new data. Returns all the cleaned rows'''
+    df = build_cache(pattern, cache_dir)
+    for cube in cubes:
+        cube.rebuild(df)
     
     return df
 
-def create_fraud_df(df):
-    '''This function takes in the crime dataframe, and creates a new dataframe based on the categorization
-    of crime description. It also renames columns for usability, converts the date column to a DateTime type,
+@instrument.stage()
+def update_cache(pattern=CSV_PATTERN, cache_dir=CACHE_DIR, cubes=()):
+    '''This function brings the parquet cache up to date with the yearly files without rebuilding it.
+    Only new files, and the rows appended to files that have grown, are read. The new rows are cleaned
+    with clean_data, rows already in the cache (by incident_number and offense_code) are dropped, and
+    the rest are written as new parquet parts and added in place to each cube.DailyCube in cubes
+    (cubes built from the clean crime dataframe). Returns the cleaned new rows, or None if no source
+    file changed. If there is no cache yet, or a source file was removed or changed other than by
+    appending rows, the cache is rebuilt, the cubes are rebuilt from it and all rows are returned'''
+    manifest = read_manifest(cache_dir)
+    paths = get_yearly_files(pattern)
+    names = [os.path.basename(path) for path in paths]
+    if (manifest is None) or not set(manifest['sources']) <= set(names):
+        return rebuild_cache(pattern, cache_dir, cubes)
+    sources = manifest['sources']
+    frames = []
+    for path, name in zip(paths, names):
+        recorded = sources.get(name)
+        size = os.path.getsize(path)
+        if recorded is None:
+            frames.append(read_yearly_csv(path))
+            sources[name] = file_state(path)
+            continue
+        if (os.path.getmtime(path) == recorded['mtime']) and (size == recorded['size']):
+            continue
+        blocks = appended_blocks(path, recorded, size)
+        if blocks is not None:
+            #Only read the rows past the end of the file as it was last seen
+            frames.append(read_yearly_csv(path, offset=recorded['size'], size=size))
+            sources[name] = file_state(path, size, blocks)
+        elif (size == recorded['size']) and (combine_hashes(block_hashes(path)) == recorded['sha1']):
+            #Touched without changing its contents
+            sources[name] = dict(recorded, mtime=os.path.getmtime(path))
+        else:
+            #Edited or removed rows can't be patched by appending parts
+            return rebuild_cache(pattern, cache_dir, cubes)
+    remove_manifest(cache_dir)
+    delta = clean_data(concat_frames(frames)).drop_duplicates(INCIDENT_KEY) if frames else None
+    new_rows = []
+    if delta is not None:
+        for year, year_df in delta.groupby('year', sort=True):
+            year_df = drop_known_incidents(year_df, year, cache_dir)
+            if len(year_df):
+                year_df.to_parquet(next_part_path(year, cache_dir), index=False)
+                new_rows.append(year_df)
+    delta = concat_frames(new_rows) if new_rows else (delta.iloc[:0] if delta is not None else None)
+    if new_rows:
+        manifest['years'] = sorted(set(manifest['years']) | {int(year) for year in delta['year'].unique()})
+        for cube in cubes:
+            cube.update(delta)
+    write_manifest(manifest, cache_dir)
+    
+    return delta
+
+@instrument.stage()
+def get_clean_data(columns=None, years=None, start=None, end=None):
+    '''This function returns the cleaned Boston Crime dataframe. It reads the parquet cache,
+    updating it first if the yearly files have changed since it was written. If the yearly files
+    aren't present it falls back to cleaning the combined boston_crime.csv'''
+    if get_yearly_files():
+        if cache_is_stale():
+            update_cache()
+        return read_cache(columns=columns, years=years, start=start, end=end)
+    if read_manifest() is not None:
+        return read_cache(columns=columns, years=years, start=start, end=end)
+    #Get CSV from file
+    df = clean_data(pd.read_csv('boston_crime.csv', index_col=0))
+    if years is not None:
+        df = df[df['year'].isin(years)]
+    if start is not None:
+        df = df[df['occurred_on_date'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['occurred_on_date'] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    if columns is not None:
+        df = df[columns]
+    
+    return df.reset_index(drop=True)
+
+def source_fingerprint():
+    '''This function returns a key identifying the content of the current source data: the hash of
+    every yearly file (bringing the cache up to date first), or the modification time and size of
+    boston_crime.csv when the yearly files aren't present'''
+    if get_yearly_files():
+        if cache_is_stale():
+            update_cache()
+    manifest = read_manifest()
+    if manifest is not None:
+        return tuple(sorted((name, state['sha1']) for name, state in manifest['sources'].items()))
+    
+    return ('boston_crime.csv', os.path.getmtime('boston_crime.csv'), os.path.getsize('boston_crime.csv'))
+
+##------------------------Offense Categories----------------------##
+
+#Offense categories and the pattern matched against the (lowercase) offense descriptions to find them
+OFFENSE_CATEGORIES = {
+    'fraud': 'fraud',
+    'larceny': 'larceny',
+    'assault': 'assault',
+    'robbery': 'robbery',
+    'burglary': 'burglary|b&e',
+    'auto_theft': 'auto theft',
+    'vandalism': 'vandalism',
+    'drugs': 'drugs',
+    'weapon': 'weapon',
+}
+
+def posting_lists(codes, n):
+    '''This function groups row positions by integer code. Returns (rows, offsets) where the
+    rows holding code k are rows[offsets[k]:offsets[k + 1]], in ascending order. Missing
+    values (code -1) are left out'''
+    #A stable sort keeps each code's rows in their original order
+    rows = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=n)
+    offsets = np.concatenate([[0], np.cumsum(counts)]) + (codes < 0).sum()
+    
+    return rows, offsets
+
+class OffenseIndex:
+    '''Row positions of every distinct offense description and offense code in a crime dataframe.
+    It is built once from the categorical codes, after which any offense category is found by
+    matching its pattern against the distinct descriptions and gathering their rows, without
+    rescanning the description column. The offense code postings are only built on the first code
+    query, so a dataframe without offense_code can still be indexed by description'''
+    
+    def __init__(self, df):
+        descriptions = df['offense_description']
+        if not isinstance(descriptions.dtype, pd.CategoricalDtype):
+            descriptions = descriptions.astype('category')
+        self.descriptions = descriptions.cat.categories
+        self._description_rows = posting_lists(descriptions.cat.codes.to_numpy(), len(self.descriptions))
+        self._offense_code = df['offense_code'] if 'offense_code' in df.columns else None
+        self._code_rows = None
+        self._categories = {}
+    
+    def code_rows(self):
+        '''This function returns (distinct offense codes, their posting lists), built the first time'''
+        if self._code_rows is None:
+            if self._offense_code is None:
+                raise KeyError('offense_code is needed to look up offense codes')
+            code_ids, codes = pd.factorize(self._offense_code, sort=True)
+            self._code_rows = (codes, posting_lists(code_ids, len(codes)))
+            self._offense_code = None
+        
+        return self._code_rows
+    
+    def gather(self, postings, ids):
+        '''This function concatenates the posting lists of ids into sorted row positions'''
+        rows, offsets = postings
+        chunks = [rows[offsets[i]:offsets[i + 1]] for i in ids]
+        if not chunks:
+            return np.array([], dtype=np.intp)
+        
+        return np.sort(np.concatenate(chunks))
+    
+    def rows(self, category):
+        '''This function returns the sorted row positions of an offense category. category is a key
+        of OFFENSE_CATEGORIES, any other regex pattern matched against the offense descriptions, or
+        an offense code / list of offense codes'''
+        key = tuple(category) if isinstance(category, (list, tuple, set, np.ndarray)) else category
+        if key not in self._categories:
+            if isinstance(category, str):
+                pattern = OFFENSE_CATEGORIES.get(category, category)
+                #Only the distinct descriptions are scanned
+                ids = np.flatnonzero(self.descriptions.str.contains(pattern))
+                self._categories[key] = self.gather(self._description_rows, ids)
+            else:
+                codes, postings = self.code_rows()
+                ids = codes.get_indexer(np.atleast_1d(category))
+                self._categories[key] = self.gather(postings, ids[ids >= 0])
+        
+        return self._categories[key]
+
+@instrument.stage()
+def get_offense_index(df):
+    '''This function returns the OffenseIndex of df, building it the first time df is seen.
+    The index describes df as it was when first indexed, so build a new OffenseIndex
+    if df is modified in place'''
+    return memo.per_frame_cache(df, 'offense_index', lambda: OffenseIndex(df))
+
+@instrument.stage()
+def create_offense_df(df, category, index=None):
+    '''This function takes in the crime dataframe, and creates a new dataframe of one offense category
+    (see OffenseIndex.rows). It also renames columns for usability, converts the date column to a DateTime type,
     takes the date and transforms the index into a DateTime index, and adds a column called "count of crime",
     which assigns a value of 1 to every row'''
-    #Uses str.contains to get fraud from description
-    fraud_df = df[df['offense_description'].str.contains('fraud')]
+    if index is None:
+        index = get_offense_index(df)
+    #Pull the category's rows from the offense index
+    offense_df = df.take(index.rows(category))
     #Rename date column to make it easier
-    fraud_df.rename(columns = {'occurred_on_date':'date'}, inplace = True)
+    offense_df = offense_df.rename(columns = {'occurred_on_date':'date'})
     #Occured on date is an object, lets make it date time
-    fraud_df['date'] = pd.to_datetime(fraud_df['date'])
+    offense_df['date'] = pd.to_datetime(offense_df['date'])
     #adding a column to the dataframe to get a count of crime
-    fraud_df['count_of_crime'] = 1
+    offense_df['count_of_crime'] = 1
     #Remove hour from date time, since we aren't looking for that now
-    fraud_df['date'] = fraud_df['date'].dt.normalize()
+    offense_df['date'] = offense_df['date'].dt.normalize()
     # #Reset index to date time
-    fraud_df = fraud_df.set_index('date').sort_index()
-    fraud_df
+    offense_df = offense_df.set_index('date').sort_index()
     
-    return fraud_df
\ No newline at end of file
+    return offense_df
+
+def create_fraud_df(df, index=None):
+    '''This function takes in the crime dataframe, and creates a new dataframe of fraud crimes,
+    i.e. offenses containing fraud in their description'''
+    return create_offense_df(df, 'fraud', index)